@@ -1,2 +1,5 @@
+from .cache import *
 from .fgsm import *
 from .ifgsm import *
+from .pgd import *
+from .store import *
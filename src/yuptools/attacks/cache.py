@@ -0,0 +1,112 @@
+from typing import Iterable
+
+import hashlib
+import torch
+
+__all__ = [
+    "model_weights_hash",
+    "AdversarialCache",
+]
+
+
+def model_weights_hash(
+        model: torch.nn.Module,
+) -> str:
+    sha = hashlib.sha256()
+
+    for name, tensor in model.state_dict().items():
+        sha.update(name.encode())
+        sha.update(str(tuple(tensor.shape)).encode())
+        sha.update(str(tensor.dtype).encode())
+        sha.update(tensor.detach().to("cpu").contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+
+    return sha.hexdigest()
+
+
+class AdversarialCache:
+    def __init__(
+            self,
+            root: str,
+            model: torch.nn.Module,
+            attack,
+            dataset,
+            dtype: str = "float16",
+    ) -> None:
+        from .store import AdversarialStore
+        from ..datasets.batch_transforms import describe_transform
+        from ..tools.pathtools import join_path
+
+        # uint8 rounds data to the k / 255 grid: exact only for bounded attacks on it (checked by the store)
+        assert dtype != "uint8" or getattr(attack, "bound", False), \
+            f"uint8 caches hold adversarial data in [0, 1] only, i.e., of bounded attacks; " \
+            f"use float16 for {getattr(attack, 'name', type(attack).__name__)}."
+
+        self.root = root
+        self.model = model
+        self.attack = attack
+        self.dtype = dtype
+
+        # float16: perturbations (adversarial - clean data), added back to the data on read;
+        # uint8: adversarial data
+        self.content = "perturbation" if dtype == "float16" else "data"
+
+        # key: (model weights, attack name & parameters, dataset & transform) -> store indexed by data index
+        self.model_hash = model_weights_hash(model)
+        self.attack_name = getattr(attack, "name", type(attack).__name__)
+        self.transform_hash = hashlib.sha256(
+            describe_transform(getattr(dataset, "transform", None)).encode()
+        ).hexdigest()
+
+        self.save_dir = join_path([
+            root,
+            self.model_hash[:16],
+            f"{dataset}-{len(dataset)}-{self.transform_hash[:16]}",
+            f"{self.attack_name}-{self.content}-{dtype}",
+        ])
+
+        data, _ = dataset[0]
+
+        self.store = AdversarialStore(
+            save_dir=self.save_dir,
+            num_data=len(dataset),
+            shape=data.shape,
+            dtype=dtype,
+        )
+
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(
+            self,
+            indices: Iterable[int],
+            data: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> torch.Tensor:
+        from .store import half_toward_zero
+
+        indices = torch.as_tensor(list(indices), dtype=torch.int64)
+        data = data.detach().to("cpu")
+
+        _, done = self.store.read(indices)
+        misses = (~done).nonzero().squeeze(dim=-1)
+
+        # compute and store missing adversarial data only;
+        # perturbations are rounded toward zero, so that they stay in the epsilon-ball
+        if len(misses):
+            _data = self.attack(data[misses], targets[misses]).to("cpu")
+
+            if self.content == "perturbation":
+                _data = half_toward_zero(_data - data[misses])
+
+            self.store.write(indices[misses].tolist(), _data)
+
+        self.hits += len(indices) - len(misses)
+        self.misses += len(misses)
+
+        # always served from the store, so that cached and fresh data are identical
+        _data, _ = self.store.read(indices)
+
+        if self.content == "perturbation":
+            _data = data + _data
+
+        return _data
@@ -1,9 +1,19 @@
+from typing import ContextManager, Dict, Iterable, Iterator, Optional
+
+from contextlib import contextmanager
 import torch
 
 __all__ = [
+    "amp_dtypes",
+
     "FGSM",
 ]
 
+amp_dtypes = {
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
 
 class FGSM:
     def __init__(
@@ -14,7 +24,13 @@ class FGSM:
             bound: bool = False,
             seed: int = None,
             use_cuda: bool = False,
+            amp: Optional[str] = None,
+            channels_last: bool = False,
     ) -> None:
+        assert amp is None or amp in amp_dtypes, \
+            f"Unsupported amp {amp}.\n" \
+            f"Supported amp: {list(amp_dtypes.keys())}"
+
         self.model = model
         self.epsilon = epsilon
         self.targeted = targeted
@@ -22,6 +38,13 @@ class FGSM:
         self.seed = seed
         self.use_cuda = use_cuda
         self.machine = "cuda" if self.use_cuda else "cpu"
+        self.criterion = torch.nn.CrossEntropyLoss()
+
+        # mixed precision: fp16 gradients underflow without loss scaling
+        self.amp = amp
+        self.loss_scale = 2. ** 16 if amp == "fp16" else 1.
+
+        self.channels_last = channels_last
 
         FGSM.__name__ = \
             f"FGSM(" \
@@ -31,6 +54,13 @@ class FGSM:
             f"seed={self.seed}" \
             f")"
 
+        # amp only when set, to keep names of fp32 attacks unchanged
+        if self.amp is not None:
+            FGSM.__name__ = FGSM.__name__[:-1] + f", amp={self.amp})"
+
+        # per instance: FGSM.__name__ follows the latest instance
+        self.name = FGSM.__name__
+
     def __call__(
             self,
             data: torch.Tensor,
@@ -46,33 +76,196 @@ class FGSM:
 
         return _data
 
+    def sweep(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            epsilons: Iterable[float],
+            batch_size: Optional[int] = None,
+            return_data: bool = False,
+    ) -> Dict[str, torch.Tensor]:
+        data = data.detach().to(self.machine)
+        targets = targets.detach().to(self.machine)
+
+        _data = self.prepare(data).clone().requires_grad_(True)
+
+        # sign gradient does not depend on epsilon: computed once
+        with self.model_memory_format(), self.random_seed():
+            grad = self.device_gradient(_data, targets)
+
+        epsilons = torch.as_tensor(list(epsilons), dtype=data.dtype, device=self.machine)
+        num_epsilons = len(epsilons)
+        num_data = len(data)
+
+        # (E * N, ...) perturbed data, built and forwarded in chunks of batch_size if given:
+        # flat index i -> (epsilon i // N, data i % N)
+        total = num_epsilons * num_data
+
+        if batch_size is None:
+            batch_size = total
+
+        shape = (-1, *[1] * (data.dim() - 1))
+
+        preds = []
+        perturbed = []
+
+        with torch.no_grad(), self.model_memory_format():
+            for start in range(0, total, batch_size):
+                indices = torch.arange(start, min(start + batch_size, total), device=self.machine)
+                eps = epsilons[indices // num_data].reshape(shape)
+
+                pert = (grad[indices % num_data] * eps).clamp(-eps, eps)
+
+                _data = data[indices % num_data] + pert
+
+                if self.bound:
+                    _data = _data.clamp(0, 1)
+
+                outputs = self.model(self.prepare(_data))
+                preds.append(torch.argmax(outputs, dim=-1))
+
+                if return_data:
+                    perturbed.append(_data.to("cpu"))
+
+        preds = torch.cat(preds, dim=0).reshape(num_epsilons, num_data)
+        accs = torch.eq(preds, targets[None, :]).float().mean(dim=-1)
+
+        results = {
+            "epsilons": epsilons.to("cpu"),
+            "preds": preds.to("cpu"),
+            "accs": accs.to("cpu"),
+        }
+
+        if return_data:
+            results["data"] = torch.cat(perturbed, dim=0).reshape(num_epsilons, *data.shape)
+
+        return results
+
     def gradient(
             self,
             data: torch.Tensor,
             targets: torch.Tensor,
     ) -> torch.Tensor:
-        from ..tools.randtools import set_random_seed, unset_random_seed
+        data = self.prepare(data)
+        targets = targets.detach().to(self.machine)
 
-        set_random_seed(self.seed)
+        data.requires_grad = True
+
+        with self.model_memory_format(), self.random_seed():
+            grad = self.device_gradient(data, targets).to("cpu")
+
+        return grad
 
+    def prepare(
+            self,
+            data: torch.Tensor,
+    ) -> torch.Tensor:
         data = data.detach().to(self.machine)
-        targets = targets.detach().to(self.machine)
 
-        data.requires_grad = True
+        if self.channels_last and data.dim() == 4:
+            data = data.contiguous(memory_format=torch.channels_last)
 
-        outputs = self.model(data)
-        self.model.zero_grad()
-        loss = torch.nn.CrossEntropyLoss()(outputs, targets)
-        loss.backward()
+        return data
 
-        with torch.no_grad():
-            data_grad = data.grad.data
+    @contextmanager
+    def model_memory_format(
+            self,
+    ) -> Iterator[None]:
+        # 4-dimensional weights of the model in the channels-last memory format only while attacking:
+        # the caller's model is restored on exit
+        if not self.channels_last:
+            yield
+            return
+
+        tensors = [
+            tensor for tensor in [*self.model.parameters(), *self.model.buffers()]
+            if tensor.dim() == 4
+        ]
+        originals = [tensor.data for tensor in tensors]
+
+        for tensor in tensors:
+            tensor.data = tensor.data.contiguous(memory_format=torch.channels_last)
+
+        try:
+            yield
+        finally:
+            for tensor, original in zip(tensors, originals):
+                tensor.data = original
+
+    def random_seed(
+            self,
+    ) -> ContextManager[None]:
+        from ..tools.randtools import is_stochastic, local_random_seed
+
+        # seed only reseeds (process-wide, thread-unsafe) global RNGs when the model draws from them:
+        # deterministic models are attacked without touching global state
+        return local_random_seed(self.seed if is_stochastic(self.model) else None)
+
+    def check_gradient(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            tol: float = 0.9,
+    ) -> float:
+        # fraction of sign gradient elements that agree with the fp32 path
+        grad = self.gradient(data, targets)
 
-        grad = data_grad.sign().detach().to("cpu")
+        amp, loss_scale = self.amp, self.loss_scale
+        self.amp, self.loss_scale = None, 1.
 
-        if self.targeted:
-            grad = -grad
+        try:
+            fp32_grad = self.gradient(data, targets)
+        finally:
+            self.amp, self.loss_scale = amp, loss_scale
+
+        agreement = float(torch.eq(grad, fp32_grad).float().mean())
+
+        assert agreement >= tol, \
+            f"Sign gradients of {self.name} agree with fp32 " \
+            f"on {agreement * 100:.2f}% of elements (< {tol * 100:.2f}%)."
+
+        return agreement
+
+    def device_gradient(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            out: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        # data: leaf tensor on self.machine which requires grad;
+        # its .grad buffer is reused across calls
+        scale = self.loss_scale
+
+        while True:
+            if data.grad is not None:
+                data.grad.zero_()
+
+            with torch.autocast(
+                    device_type=self.machine,
+                    dtype=amp_dtypes.get(self.amp, torch.bfloat16),
+                    enabled=self.amp is not None,
+            ):
+                outputs = self.model(data)
+
+            self.model.zero_grad()
+            loss = self.criterion(outputs.float(), targets)
+
+            # sign gradient is invariant to the loss scale: no unscaling needed
+            if scale != 1:
+                loss = loss * scale
+
+            loss.backward()
+
+            # overflow: retry with a smaller loss scale
+            if scale <= 1 or torch.isfinite(data.grad).all():
+                break
+
+            scale = scale / 2
+
+        with torch.no_grad():
+            grad = torch.sign(data.grad, out=out)
 
-        unset_random_seed()
+            if self.targeted:
+                grad = grad.neg_()
 
         return grad
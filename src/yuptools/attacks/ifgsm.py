@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional, Tuple
 
 import torch
 import tqdm
@@ -20,6 +20,8 @@ class IFGSM:
             seed: int = None,
             use_cuda: bool = False,
             verbose: bool = False,
+            amp: Optional[str] = None,
+            channels_last: bool = False,
     ) -> None:
         self.model = model
         self.alpha = alpha
@@ -31,6 +33,8 @@ class IFGSM:
         self.use_cuda = use_cuda
         self.machine = "cuda" if self.use_cuda else "cpu"
         self.verbose = verbose
+        self.amp = amp
+        self.channels_last = channels_last
 
         IFGSM.__name__ = \
             f"IFGSM(" \
@@ -42,69 +46,110 @@ class IFGSM:
             f"seed={self.seed}" \
             f")"
 
+        # amp only when set, to keep names of fp32 attacks unchanged
+        if self.amp is not None:
+            IFGSM.__name__ = IFGSM.__name__[:-1] + f", amp={self.amp})"
+
+        # per instance: IFGSM.__name__ follows the latest instance
+        self.name = IFGSM.__name__
+
     def __call__(
             self,
             data: torch.Tensor,
             targets: torch.Tensor,
     ) -> torch.Tensor:
+        _data, _ = self.attack(
+            data=data,
+            targets=targets,
+            targeted=self.targeted,
+            return_gradients=False,
+        )
+
+        return _data
+
+    def gradients(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> List[torch.Tensor]:
+        _, grads = self.attack(
+            data=data,
+            targets=targets,
+            targeted=False,
+            return_gradients=True,
+        )
+
+        return grads
+
+    def attack(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            targeted: bool,
+            return_gradients: bool = False,
+    ) -> Tuple[torch.Tensor, List[torch.Tensor]]:
         from .fgsm import FGSM
 
         fgsm = FGSM(
             model=self.model,
             epsilon=self.alpha,
-            targeted=self.targeted,
+            targeted=targeted,
             bound=self.bound,
             seed=self.seed,
             use_cuda=self.use_cuda,
+            amp=self.amp,
+            channels_last=self.channels_last,
         )
 
-        _data = data.detach()
+        # adversarial batch and buffers stay on the device for all iterations
+        data = data.detach().to(self.machine)
+        targets = targets.detach().to(self.machine)
 
-        for _ in tqdm.trange(
-                self.iteration,
-                desc=self.__class__.__name__,
-                disable=not self.verbose,
-        ):
-            fgsm_grad = fgsm.gradient(_data, targets)
-            pert = (fgsm_grad * self.alpha).clamp(-self.epsilon, self.epsilon)
+        _data = fgsm.prepare(data).clone().requires_grad_(True)
+        pert = torch.empty_like(_data)
+        grads = []
 
-            _data = data + pert
+        with fgsm.model_memory_format(), fgsm.random_seed():
+            for _ in tqdm.trange(
+                    self.iteration,
+                    desc=self.__class__.__name__,
+                    disable=not self.verbose,
+            ):
+                fgsm.device_gradient(_data, targets, out=pert)
 
-            if self.bound:
-                _data = _data.clamp(0, 1)
+                if return_gradients:
+                    grads.append(pert.clone())
 
-        return _data
+                with torch.no_grad():
+                    pert.mul_(self.alpha).clamp_(-self.epsilon, self.epsilon)
 
-    def gradients(
+                    _data.copy_(data).add_(pert)
+
+                    if self.bound:
+                        _data.clamp_(0, 1)
+
+        grads = [grad.to("cpu") for grad in grads]
+
+        return _data.detach().to("cpu"), grads
+
+    def check_gradient(
             self,
             data: torch.Tensor,
             targets: torch.Tensor,
-    ) -> List[torch.Tensor]:
+            tol: float = 0.9,
+    ) -> float:
         from .fgsm import FGSM
 
+        # sign gradient of a single step (the first iteration), checked by FGSM
         fgsm = FGSM(
             model=self.model,
             epsilon=self.alpha,
+            targeted=self.targeted,
             bound=self.bound,
             seed=self.seed,
             use_cuda=self.use_cuda,
+            amp=self.amp,
+            channels_last=self.channels_last,
         )
 
-        _data = data.detach()
-        grads = []
-
-        for _ in tqdm.trange(
-                self.iteration,
-                desc=self.__class__.__name__,
-                disable=not self.verbose,
-        ):
-            fgsm_grad = fgsm.gradient(_data, targets)
-            grads.append(fgsm_grad)
-            pert = (fgsm_grad * self.alpha).clamp(-self.epsilon, self.epsilon)
-
-            _data = data + pert
-
-            if self.bound:
-                _data = _data.clamp(0, 1)
-
-        return grads
+        return fgsm.check_gradient(data, targets, tol)
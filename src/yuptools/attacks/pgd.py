@@ -0,0 +1,237 @@
+from typing import Tuple
+
+import torch
+import tqdm
+
+__all__ = [
+    "PGD",
+]
+
+pgd_norms = [
+    "linf",
+    "l2",
+]
+
+
+class PGD:
+    def __init__(
+            self,
+            model: torch.nn.Module,
+            alpha: float,
+            iteration: int,
+            epsilon: float,
+            norm: str = "linf",
+            restarts: int = 1,
+            random_start: bool = True,
+            early_stop: bool = True,
+            targeted: bool = False,
+            bound: bool = False,
+            seed: int = None,
+            use_cuda: bool = False,
+            verbose: bool = False,
+    ) -> None:
+        assert norm in pgd_norms, \
+            f"Unsupported norm {norm}.\n" \
+            f"Supported norms: {pgd_norms}"
+        assert restarts > 0
+
+        self.model = model
+        self.alpha = alpha
+        self.iteration = iteration
+        self.epsilon = epsilon
+        self.norm = norm
+        self.restarts = restarts
+        self.random_start = random_start
+        self.early_stop = early_stop
+        self.targeted = targeted
+        self.bound = bound
+        self.seed = seed
+        self.use_cuda = use_cuda
+        self.machine = "cuda" if self.use_cuda else "cpu"
+        self.verbose = verbose
+        self.criterion = torch.nn.CrossEntropyLoss()
+
+        # per-sample attack success of the last call
+        self.success = None
+
+        PGD.__name__ = \
+            f"PGD(" \
+            f"alpha={self.alpha}, " \
+            f"iteration={self.iteration}, " \
+            f"epsilon={self.epsilon}, " \
+            f"norm={self.norm}, " \
+            f"restarts={self.restarts}, " \
+            f"targeted={self.targeted}, " \
+            f"bound={self.bound}, " \
+            f"random_start={self.random_start}, " \
+            f"early_stop={self.early_stop}, " \
+            f"seed={self.seed}" \
+            f")"
+
+        # per instance: PGD.__name__ follows the latest instance
+        self.name = PGD.__name__
+
+    def __call__(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> torch.Tensor:
+        data = data.detach().to(self.machine)
+        targets = targets.detach().to(self.machine)
+
+        from ..tools.randtools import make_generator
+
+        generator = make_generator(self.seed, self.machine)
+
+        _data = data.clone()
+        success = torch.zeros(len(data), dtype=torch.bool, device=self.machine)
+
+        for restart in range(self.restarts):
+            # samples already fooled are not attacked again
+            indices = (~success).nonzero().squeeze(dim=-1)
+
+            if not len(indices):
+                break
+
+            x = data[indices]
+
+            if self.random_start:
+                x = self.project(x, x + self.random_delta(x, generator))
+
+            for _ in tqdm.trange(
+                    self.iteration,
+                    desc=f"[{restart + 1}/{self.restarts}] {PGD.__name__}",
+                    disable=not self.verbose,
+            ):
+                grad, fooled = self.gradient(x, targets[indices])
+
+                # early stopping: fooled samples leave later forward passes
+                if self.early_stop and fooled.any():
+                    _data[indices[fooled]] = x[fooled]
+                    success[indices[fooled]] = True
+
+                    indices = indices[~fooled]
+                    x = x[~fooled]
+                    grad = grad[~fooled]
+
+                    if not len(indices):
+                        break
+
+                x = self.project(data[indices], self.step(x, grad))
+
+            if not len(indices):
+                continue
+
+            with torch.no_grad():
+                fooled = self.is_fooled(self.model(x), targets[indices])
+
+            # fooled samples, or the last iterate of samples never fooled
+            _data[indices] = x
+            success[indices[fooled]] = True
+
+        self.success = success.to("cpu")
+
+        return _data.to("cpu")
+
+    def is_fooled(
+            self,
+            outputs: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> torch.Tensor:
+        preds = torch.argmax(outputs, dim=-1)
+
+        if self.targeted:
+            return torch.eq(preds, targets)
+
+        else:
+            return torch.ne(preds, targets)
+
+    def gradient(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        data = data.detach().requires_grad_(True)
+
+        outputs = self.model(data)
+        loss = self.criterion(outputs, targets)
+        grad, = torch.autograd.grad(loss, data)
+
+        if self.targeted:
+            grad = -grad
+
+        return grad.detach(), self.is_fooled(outputs.detach(), targets)
+
+    def step(
+            self,
+            data: torch.Tensor,
+            grad: torch.Tensor,
+    ) -> torch.Tensor:
+        if self.norm == "linf":
+            return data + self.alpha * grad.sign()
+
+        # self.norm == "l2"
+        return data + self.alpha * grad / self.norms(grad).clamp(min=1e-12)
+
+    def project(
+            self,
+            data: torch.Tensor,
+            _data: torch.Tensor,
+    ) -> torch.Tensor:
+        delta = _data - data
+
+        # project into the epsilon ball around data
+        if self.norm == "linf":
+            delta = delta.clamp(-self.epsilon, self.epsilon)
+
+        else:
+            delta = delta * (self.epsilon / self.norms(delta).clamp(min=1e-12)).clamp(max=1)
+
+        _data = data + delta
+
+        if self.bound:
+            _data = _data.clamp(0, 1)
+
+        return _data.detach()
+
+    def random_delta(
+            self,
+            data: torch.Tensor,
+            generator: torch.Generator,
+    ) -> torch.Tensor:
+        if self.norm == "linf":
+            delta = torch.rand(
+                size=data.shape,
+                generator=generator,
+                dtype=data.dtype,
+                device=data.device,
+            )
+
+            return (delta * 2 - 1) * self.epsilon
+
+        # self.norm == "l2": uniform in the epsilon ball
+        delta = torch.randn(
+            size=data.shape,
+            generator=generator,
+            dtype=data.dtype,
+            device=data.device,
+        )
+        radius = torch.rand(
+            size=(len(data), *[1] * (data.dim() - 1)),
+            generator=generator,
+            dtype=data.dtype,
+            device=data.device,
+        ) ** (1 / data[0].numel())
+
+        return delta / self.norms(delta).clamp(min=1e-12) * radius * self.epsilon
+
+    @staticmethod
+    def norms(
+            data: torch.Tensor,
+    ) -> torch.Tensor:
+        # per-sample l2 norms, broadcastable to data
+        return torch.norm(
+            data.reshape(len(data), -1),
+            p=2,
+            dim=-1,
+        ).reshape(-1, *[1] * (data.dim() - 1))
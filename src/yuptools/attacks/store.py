@@ -0,0 +1,155 @@
+from typing import Iterable, Tuple
+
+import os
+import numpy as np
+import torch
+import yaml
+
+__all__ = [
+    "store_dtypes",
+    "half_toward_zero",
+    "AdversarialStore",
+]
+
+store_dtypes = [
+    "uint8",
+    "float16",
+]
+
+
+def half_toward_zero(
+        data: torch.Tensor,
+) -> torch.Tensor:
+    # float16 values nearest to data that are not larger in magnitude (as float32):
+    # a perturbation stored this way stays in its epsilon-ball, and clean + perturbation in [0, 1]
+    half = data.to(torch.float16)
+    over = half.to(data.dtype).abs() > data.abs()
+
+    half[over] = torch.nextafter(half[over], torch.zeros_like(half[over]))
+
+    return half.to(torch.float32)
+
+
+# memory-mapped store of (adversarial) data in a compact dtype:
+# "float16" keeps data (e.g., perturbations) as half-precision floats,
+# "uint8" holds data in [0, 1] on the k / 255 grid only (e.g., of bounded attacks on uint8 images)
+class AdversarialStore:
+    def __init__(
+            self,
+            save_dir: str,
+            num_data: int,
+            shape: Iterable[int],
+            dtype: str = "float16",
+    ) -> None:
+        from ..tools.pathtools import mkdir, join_path
+
+        assert dtype in store_dtypes, \
+            f"Unsupported dtype {dtype}.\n" \
+            f"Supported dtypes: {store_dtypes}"
+
+        mkdir(save_dir)
+
+        self.save_dir = save_dir
+        self.num_data = num_data
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+        self.meta_path = join_path([save_dir, "meta.yaml"])
+        self.data_path = join_path([save_dir, "data.bin"])
+        self.done_path = join_path([save_dir, "done.bin"])
+
+        meta = {
+            "num_data": self.num_data,
+            "shape": list(self.shape),
+            "dtype": self.dtype,
+        }
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                _meta = yaml.load(f, Loader=yaml.FullLoader)
+
+            assert _meta == meta, \
+                f"{save_dir} holds a different store:\n" \
+                f"{_meta}"
+
+            mode = "r+"
+
+        else:
+            mode = "w+"
+
+        self.data = np.memmap(
+            self.data_path,
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self.num_data, *self.shape),
+        )
+        self.done = np.memmap(
+            self.done_path,
+            dtype=np.bool_,
+            mode=mode,
+            shape=(self.num_data,),
+        )
+
+        # meta is written last: a store without meta is rebuilt from scratch
+        if mode == "w+":
+            with open(self.meta_path, "w") as f:
+                yaml.dump(meta, f)
+
+    def __len__(
+            self,
+    ) -> int:
+        return self.num_data
+
+    def finished(
+            self,
+    ) -> torch.Tensor:
+        return torch.from_numpy(np.array(self.done))
+
+    def write(
+            self,
+            indices: Iterable[int],
+            data: torch.Tensor,
+    ) -> None:
+        indices = np.asarray(list(indices), dtype=np.int64)
+        data = data.detach().to("cpu")
+
+        if self.dtype == "uint8":
+            levels = data * 255
+
+            # rounding must not change data: off-grid or unbounded data need float16
+            assert len(data) == 0 or (
+                    data.min() >= 0 and data.max() <= 1
+                    and (levels - levels.round()).abs().max() <= 1e-3
+            ), \
+                f"uint8 stores only hold data in [0, 1] on the k / 255 grid " \
+                f"(e.g., of bounded attacks with epsilons of k / 255 on uint8 images); " \
+                f"use float16 instead."
+
+            data = levels.round().to(torch.uint8)
+
+        else:
+            data = data.to(torch.float16)
+
+        self.data[indices] = data.numpy()
+        self.data.flush()
+
+        # marked done only after the data is flushed
+        self.done[indices] = True
+        self.done.flush()
+
+    def read(
+            self,
+            indices: Iterable[int],
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        indices = np.asarray(list(indices), dtype=np.int64)
+
+        data = torch.from_numpy(np.array(self.data[indices]))
+        done = torch.from_numpy(np.array(self.done[indices]))
+
+        if self.dtype == "uint8":
+            data = data.to(torch.float32) / 255
+
+        else:
+            data = data.to(torch.float32)
+
+        return data, done
@@ -1,3 +1,7 @@
 from . import class_labels
 from .base import *
+from .batch_transforms import *
+from .decoders import *
 from .image_classification import *
+from .index import *
+from .packed import *
@@ -1,9 +1,14 @@
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import os
 import numpy as np
-from PIL import Image
 import torch
 from torchvision import transforms as tf
+import yaml
+
+from .decoders import default_decoder, ImageDecoder
+from .index import PathIndex
+from .packed import PackedImages
 
 __all__ = [
     "ImageClassificationDataset",
@@ -29,34 +34,99 @@ class ImageClassificationDataset:
         self.targets = None
         self.class_labels = None
 
+        # set by initialize(..., shared_dir)
+        self.shared_path = None
+        self.shared_tensor = False
+
+        # decoder of data of paths
+        self.decoder = ImageDecoder(channel=self.default_channel)
+
     def __getitem__(
             self,
             index: int,
     ) -> Tuple[Any, Any]:
         assert self.data is not None and self.targets is not None
 
-        # if type(data) == List[Tuple[path_to_data: str, target: int]]
-        if isinstance(self.data, list):
+        # if type(data) == PathIndex of (path_to_data: str, target: int)
+        if isinstance(self.data, PathIndex):
             path, target = self.data[index]
-            data = Image.open(path).convert(self.default_channel)
+            data = self.decoder(path)
+
+        # if type(data) == PackedImages: (C, H, W) uint8 torch.Tensor
+        elif isinstance(self.data, PackedImages):
+            data = self.data[index]
+            target = self.targets[index]
 
         else:
             data = self.data[index]
             target = self.targets[index]
 
         if self.transform is not None:
-            data = self.transform(data)
+            data = self.transform_of(data)(data)
 
         if self.target_transform is not None:
             target = self.target_transform(target)
 
         return data, target
 
+    def transform_of(
+            self,
+            data: Any,
+    ) -> Callable:
+        from .batch_transforms import tensor_transform_of
+
+        # packed or torchvision-decoded data are (C, H, W) uint8 tensors, which tf.ToTensor() does not take
+        if isinstance(data, torch.Tensor) and isinstance(self.data, (PathIndex, PackedImages)):
+            return tensor_transform_of(self.transform)
+
+        return self.transform
+
+    def __getitems__(
+            self,
+            indices: List[int],
+    ) -> List[Tuple[Any, Any]]:
+        # batched indexing (used by DataLoader): in-memory data are transformed as a whole batch
+        data = self.batch(torch.as_tensor(indices, dtype=torch.int64))
+
+        # data of paths are decoded (and transformed) by the threads of decoder
+        if data is None and isinstance(self.data, PathIndex):
+            return self.decoder.map(self.__getitem__, indices)
+
+        if data is None:
+            return [self[index] for index in indices]
+
+        targets = self.targets[indices]
+
+        if self.target_transform is not None:
+            targets = [self.target_transform(target) for target in targets]
+
+        return list(zip(data.unbind(dim=0), targets))
+
     def __len__(
             self,
     ) -> int:
         return len(self.data)
 
+    def __getstate__(
+            self,
+    ) -> dict:
+        state = self.__dict__.copy()
+
+        # shared data is reopened (not copied) in other processes, e.g., DataLoader workers
+        if self.shared_path is not None:
+            state["data"] = None
+
+        return state
+
+    def __setstate__(
+            self,
+            state: dict,
+    ) -> None:
+        self.__dict__.update(state)
+
+        if self.shared_path is not None:
+            self.data = self.open_shared()
+
     def __str__(
             self,
     ) -> str:
@@ -66,55 +136,186 @@ class ImageClassificationDataset:
     def make_dataset(
             directory: str,
             extensions: List[str],
-    ) -> List[Tuple[str, int]]:
-        from torchvision.datasets import DatasetFolder
+            cache: bool = True,
+    ) -> PathIndex:
+        from .index import scan_directory
 
-        datasetfolder = DatasetFolder(
-            root=directory,
-            loader=None,
+        # scanned once; later calls load the index saved next to the directory
+        path_and_target = scan_directory(
+            directory=directory,
             extensions=extensions,
-            transform=None,
-            target_transform=None,
-            is_valid_file=None,
+            cache=cache,
         )
 
-        _, class_to_idx = datasetfolder.find_classes(directory)
+        return path_and_target
 
-        path_and_target = datasetfolder.make_dataset(
-            directory=directory,
-            class_to_idx=class_to_idx,
-            extensions=extensions,
-            is_valid_file=None,
+    def set_decoder(
+            self,
+            decoder: str = default_decoder,
+            size: Optional[Tuple[int, int]] = None,
+            num_threads: int = 1,
+    ) -> None:
+        self.decoder = ImageDecoder(
+            decoder=decoder,
+            channel=self.default_channel,
+            size=size,
+            num_threads=num_threads,
         )
 
-        return path_and_target
+    def pack(
+            self,
+            save_dir: str,
+            size: Optional[Tuple[int, int]] = None,
+            num_workers: int = 0,
+            verbose: bool = False,
+    ) -> None:
+        from .packed import pack_images, paths_hash
+
+        assert isinstance(self.data, PathIndex), \
+            "Only datasets of paths can be packed."
+
+        paths = [path for path, _ in self.data]
+
+        meta = {
+            "num_data": len(self.data),
+            "size": list(size) if size is not None else None,
+            "channel": self.default_channel,
+            "paths_hash": paths_hash(paths),
+        }
+
+        # decode once; later calls reuse the pack of the same images
+        if PackedImages.exists(save_dir):
+            packed = PackedImages(save_dir)
+
+            if {k: packed.meta.get(k) for k in meta} == meta:
+                self.data = packed
+
+                return
+
+        pack_images(
+            paths=paths,
+            save_dir=save_dir,
+            size=size,
+            channel=self.default_channel,
+            num_workers=num_workers,
+            verbose=verbose,
+        )
+
+        self.data = PackedImages(save_dir)
 
     # MUST BE DONE
     def initialize(
             self,
-            data: Union[List[Tuple[str, int]], np.ndarray, torch.Tensor],
-            targets: Union[List[int], torch.Tensor],
+            data: Union[List[Tuple[str, int]], PathIndex, np.ndarray, torch.Tensor],
+            targets: Optional[Union[List[int], np.ndarray, torch.Tensor]],
             class_labels: Union[Dict[int, str], List[str]],
+            shared_dir: Optional[str] = None,
     ) -> None:
         # initialize
         self.data = data
         self.targets = targets
         self.class_labels = class_labels
 
-        # if type(targets) == list,
+        # if type(data) == List[Tuple[path_to_data: str, target: int]],
+        # type(data) <- PathIndex
+        if isinstance(self.data, list):
+            self.data = PathIndex.from_list(self.data)
+
+        # targets of PathIndex if not given
+        if self.targets is None:
+            assert isinstance(self.data, PathIndex)
+
+            self.targets = self.data.targets
+
+        # if type(targets) == list or np.ndarray,
         # type(targets) <- torch.Tensor
         if isinstance(self.targets, list):
             self.targets = torch.Tensor(self.targets)
 
+        elif isinstance(self.targets, np.ndarray):
+            self.targets = torch.from_numpy(self.targets)
+
         self.targets = self.targets.to(torch.int64)
 
+        # class -> indices of data of the class
+        classes, counts = torch.unique(self.targets, sorted=True, return_counts=True)
+        order = torch.argsort(self.targets, stable=True)
+
+        # (cloned: views of one storage would each pickle the whole storage)
+        self.class_indices = {
+            c: indices.clone() for c, indices in zip(classes.tolist(), torch.split(order, counts.tolist()))
+        }
+
+        if shared_dir is not None:
+            self.share(shared_dir)
+
+    def share(
+            self,
+            shared_dir: str,
+    ) -> None:
+        from .shared import share_array
+
+        assert isinstance(self.data, (np.ndarray, torch.Tensor)), \
+            "Only in-memory data can be shared."
+
+        self.shared_tensor = isinstance(self.data, torch.Tensor)
+        self.shared_path = share_array(
+            array=self.data.numpy() if self.shared_tensor else self.data,
+            shared_dir=shared_dir,
+            name=self.name,
+        )
+
+        # one physical copy of data for all processes; targets in shared memory for DataLoader workers
+        self.data = self.open_shared()
+        self.targets.share_memory_()
+
+    def open_shared(
+            self,
+    ) -> Union[np.ndarray, torch.Tensor]:
+        from .shared import open_shared_array
+
+        data = open_shared_array(self.shared_path)
+
+        return torch.from_numpy(data) if self.shared_tensor else data
+
+    def batch(
+            self,
+            indices: torch.Tensor,
+    ) -> Optional[torch.Tensor]:
+        from .batch_transforms import batch_transform_of
+
+        # in-memory data only: a single indexing op and one transform of the whole batch
+        if not isinstance(self.data, (np.ndarray, torch.Tensor)):
+            return None
+
+        if isinstance(self.data, np.ndarray):
+            indices = indices.numpy()
+
+        if self.transform is None:
+            data = self.data[indices]
+
+            return torch.from_numpy(data) if isinstance(data, np.ndarray) else data
+
+        transform = batch_transform_of(self.transform)
+
+        # no batched equivalent of transform
+        if transform is None:
+            return None
+
+        return transform(self.data[indices])
+
     def data_and_targets_of_class_c(
             self,
             c: int,
     ) -> Tuple[Any, Any]:
         assert self.data is not None and self.targets is not None
 
-        indices = torch.arange(len(self))[self.targets == c]
+        indices = self.class_indices.get(c, torch.zeros(size=(0,), dtype=torch.int64))
+
+        data_c = self.batch(indices)
+
+        if data_c is not None and self.target_transform is None:
+            return data_c, self.targets[indices]
 
         data_c = []
         targets_c = []
@@ -136,18 +337,103 @@ class ImageClassificationDataset:
 
     def mean_and_std_of_data(
             self,
+            transformed: bool = False,
+            fraction: float = 1.,
+            batch_size: int = 256,
+            num_workers: int = 0,
+            seed: Optional[int] = None,
+            cache_dir: Optional[str] = None,
     ) -> Tuple[Any, Any]:
+        from .statistics import Statistics, SampleStatistics
+
         assert self.data is not None
-        assert not isinstance(self.data, list)
+        assert 0. < fraction <= 1.
+
+        # raw data: in-memory data only
+        if not transformed:
+            assert not isinstance(self.data, (PathIndex, PackedImages))
+
+        cache_path = self.statistics_cache_path(cache_dir, transformed, fraction, seed) \
+            if cache_dir is not None else None
+
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, "r") as f:
+                cache = yaml.load(f, Loader=yaml.FullLoader)
+
+            return torch.tensor(cache["mean"]), torch.tensor(cache["std"])
+
+        indices = self.sample_indices(fraction, seed)
+        statistics = Statistics()
+
+        # raw data, streamed in chunks: statistics over all but the channel (last) dimension
+        if not transformed:
+            for chunk in torch.split(indices, batch_size):
+                data = self.data[chunk.numpy() if isinstance(self.data, np.ndarray) else chunk]
+
+                statistics.update(*[
+                    s.unsqueeze(dim=0)
+                    for s in Statistics.of(torch.as_tensor(data), dims=range(min(3, data.ndim)))
+                ])
+
+        # transformed (C, ...) samples: per-sample statistics computed in DataLoader workers
+        else:
+            from torch.utils.data import DataLoader, Subset
 
-        data = self.data
+            dataloader = DataLoader(
+                dataset=SampleStatistics(Subset(self, indices.tolist())),
+                batch_size=batch_size,
+                shuffle=False,
+                num_workers=num_workers,
+            )
 
-        if isinstance(data, np.ndarray):
-            data = torch.from_numpy(data)
+            for (count, mean, m2) in dataloader:
+                statistics.update(count, mean, m2)
 
-        data = data.type(torch.float32)
+        mean, std = statistics.mean_and_std()
 
-        mean = data.mean(axis=(0, 1, 2))
-        std = data.std(axis=(0, 1, 2))
+        if cache_path is not None:
+            with open(cache_path, "w") as f:
+                yaml.dump({
+                    "mean": mean.tolist(),
+                    "std": std.tolist(),
+                }, f)
 
         return mean, std
+
+    def sample_indices(
+            self,
+            fraction: float = 1.,
+            seed: Optional[int] = None,
+    ) -> torch.Tensor:
+        from ..tools.randtools import make_generator
+
+        if fraction == 1.:
+            return torch.arange(len(self))
+
+        num_samples = max(int(round(fraction * len(self))), 1)
+
+        indices = torch.randperm(len(self), generator=make_generator(seed))[:num_samples]
+
+        # sorted for sequential access
+        return torch.sort(indices).values
+
+    def statistics_cache_path(
+            self,
+            cache_dir: str,
+            transformed: bool,
+            fraction: float,
+            seed: Optional[int],
+    ) -> str:
+        import hashlib
+        from .batch_transforms import describe_transform
+        from ..tools.pathtools import mkdir, join_path
+
+        mkdir(cache_dir)
+
+        # one cache per (dataset, transform) and sampling
+        key = \
+            f"{self.name}|{len(self)}|{transformed}|" \
+            f"{describe_transform(self.transform) if transformed else None}|" \
+            f"{fraction}|{seed}"
+
+        return join_path([cache_dir, f"{self.name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.yaml"])
@@ -0,0 +1,164 @@
+from typing import Callable, List, Optional, Union
+
+import functools
+import inspect
+import numpy as np
+import torch
+from torchvision import transforms as tf
+
+__all__ = [
+    "batch_transformable",
+    "to_tensor_batch",
+    "numpy_image_to_tensor_batch",
+    "batch_transform_of",
+    "tensor_transform_of",
+    "describe_transform",
+]
+
+# transforms of (B, C, H, W) tensors that run on the whole batch as they are
+batch_transformable = (
+    tf.Resize,
+    tf.CenterCrop,
+    tf.Normalize,
+    tf.ConvertImageDtype,
+)
+
+
+def layout_batch(
+        data: Union[np.ndarray, torch.Tensor],
+) -> torch.Tensor:
+    # (B, H, W, C) or (B, H, W) -> (B, C, H, W), not scaled
+    data = torch.as_tensor(data)
+
+    if data.dim() == 3:
+        data = data.unsqueeze(dim=-1)
+
+    return data.permute(0, 3, 1, 2).contiguous()
+
+
+def scale_batch(
+        data: torch.Tensor,
+) -> torch.Tensor:
+    # uint8 scaled to [0, 1], as tf.ToTensor()
+    if data.dtype == torch.uint8:
+        return data.to(torch.float32).div(255)
+
+    return data
+
+
+def to_tensor_batch(
+        data: Union[np.ndarray, torch.Tensor],
+) -> torch.Tensor:
+    # tf.ToTensor() over a batch
+    return scale_batch(layout_batch(data))
+
+
+def numpy_image_to_tensor_batch(
+        data: Union[np.ndarray, torch.Tensor],
+) -> torch.Tensor:
+    # numpy_image_to_tensor over a batch
+    return layout_batch(data)
+
+
+class BatchCompose:
+    def __init__(
+            self,
+            transforms: List[Callable[[torch.Tensor], torch.Tensor]],
+    ) -> None:
+        self.transforms = transforms
+
+    def __call__(
+            self,
+            data: Union[np.ndarray, torch.Tensor],
+    ) -> torch.Tensor:
+        data = layout_batch(data)
+
+        for transform in self.transforms:
+            data = transform(data)
+
+        return data
+
+
+def batch_transform_of(
+        transform: Optional[Callable],
+) -> Optional[Callable[[Union[np.ndarray, torch.Tensor]], torch.Tensor]]:
+    # batched equivalent of a per-sample transform of (H, W, C) images, or None if there is none:
+    # the batch is laid out as a (B, C, H, W) tensor first, then transformed in the order of transform
+    from .image_classification import numpy_image_to_tensor
+
+    if transform is None:
+        return None
+
+    transforms = transform.transforms if isinstance(transform, tf.Compose) else [transform, ]
+
+    batch_transforms = []
+
+    for t in transforms:
+        if isinstance(t, tf.ToTensor):
+            batch_transforms.append(scale_batch)
+
+        elif t is numpy_image_to_tensor:
+            continue
+
+        elif isinstance(t, batch_transformable):
+            batch_transforms.append(t)
+
+        else:
+            return None
+
+    return BatchCompose(batch_transforms)
+
+
+def tensor_transform_of(
+        transform: Optional[Callable],
+) -> Optional[Callable[[torch.Tensor], torch.Tensor]]:
+    # equivalent of a per-sample transform of (H, W, C) images for (C, H, W) uint8 tensors
+    # (packed or torchvision-decoded data): tf.ToTensor() only scales and numpy_image_to_tensor does nothing,
+    # any other transform runs on the tensor as it is
+    from .image_classification import numpy_image_to_tensor
+
+    if transform is None:
+        return None
+
+    transforms = transform.transforms if isinstance(transform, tf.Compose) else [transform, ]
+
+    tensor_transforms = []
+
+    for t in transforms:
+        if isinstance(t, tf.ToTensor):
+            tensor_transforms.append(scale_batch)
+
+        elif t is numpy_image_to_tensor:
+            continue
+
+        else:
+            tensor_transforms.append(t)
+
+    return tf.Compose(tensor_transforms)
+
+
+def describe_transform(
+        transform: Optional[Callable],
+) -> str:
+    # description of a transform that is stable across processes (e.g., for cache keys):
+    # functions by their qualified names (their repr holds a memory address), transforms by their repr
+    if transform is None:
+        return "None"
+
+    if isinstance(transform, tf.Compose):
+        return f"Compose([{', '.join(describe_transform(t) for t in transform.transforms)}])"
+
+    if isinstance(transform, functools.partial):
+        return \
+            f"partial({describe_transform(transform.func)}, " \
+            f"{transform.args}, " \
+            f"{sorted(transform.keywords.items())})"
+
+    if inspect.isroutine(transform):
+        return f"{transform.__module__}.{transform.__qualname__}"
+
+    # objects without a repr of their own (repr with a memory address): by their classes
+    if type(transform).__repr__ is object.__repr__:
+        return f"{type(transform).__module__}.{type(transform).__qualname__}"
+
+    return repr(transform)
@@ -0,0 +1,133 @@
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+from PIL import Image
+import torch
+
+__all__ = [
+    "image_decoders",
+    "default_decoder",
+    "decode_pil",
+    "decode_pil_draft",
+    "decode_torchvision",
+    "ImageDecoder",
+]
+
+image_decoders = [
+    "pil",
+    "pil_draft",
+    "torchvision",
+]
+
+default_decoder = "pil"
+
+
+def decode_pil(
+        path: str,
+        channel: str = "RGB",
+        size: Optional[Tuple[int, int]] = None,
+) -> Image.Image:
+    return Image.open(path).convert(channel)
+
+
+def decode_pil_draft(
+        path: str,
+        channel: str = "RGB",
+        size: Optional[Tuple[int, int]] = None,
+) -> Image.Image:
+    image = Image.open(path)
+
+    # JPEG only: decode at the smallest scale (1/2, 1/4, or 1/8) still at least size (height, width);
+    # for a downstream resize to size, most of the full-resolution decode is skipped
+    if size is not None:
+        image.draft(channel, (size[1], size[0]))
+
+    return image.convert(channel)
+
+
+def decode_torchvision(
+        path: str,
+        channel: str = "RGB",
+        size: Optional[Tuple[int, int]] = None,
+) -> torch.Tensor:
+    from torchvision.io import decode_image, read_file, ImageReadMode
+
+    modes = {
+        "RGB": ImageReadMode.RGB,
+        "L": ImageReadMode.GRAY,
+    }
+
+    assert channel in modes, \
+        f"Unsupported channel {channel} for torchvision decoding.\n" \
+        f"Supported channels: {list(modes.keys())}"
+
+    # (C, H, W) uint8 tensor (decode_jpeg for JPEG), as packed images;
+    # decode_image takes encoded bytes (a path only from torchvision 0.20)
+    return decode_image(read_file(path), mode=modes[channel])
+
+
+# pluggable image decoder with a (lazily created, per-process) thread pool for batches:
+# PIL and torchvision decode without holding the GIL, so threads decode in parallel
+class ImageDecoder:
+    def __init__(
+            self,
+            decoder: str = default_decoder,
+            channel: str = "RGB",
+            size: Optional[Tuple[int, int]] = None,
+            num_threads: int = 1,
+    ) -> None:
+        assert decoder in image_decoders, \
+            f"Unsupported decoder {decoder}.\n" \
+            f"Supported decoders: {image_decoders}"
+        assert num_threads > 0
+
+        self.decoder = decoder
+        self.channel = channel
+        self.size = size
+        self.num_threads = num_threads
+
+        self.decode = {
+            "pil": decode_pil,
+            "pil_draft": decode_pil_draft,
+            "torchvision": decode_torchvision,
+        }[decoder]
+
+        self.executor = None
+        self.executor_pid = None
+
+    def __call__(
+            self,
+            path: str,
+    ) -> Union[Image.Image, torch.Tensor]:
+        return self.decode(path, self.channel, self.size)
+
+    def __getstate__(
+            self,
+    ) -> dict:
+        # thread pools cannot be pickled (e.g., to DataLoader workers)
+        state = self.__dict__.copy()
+        state["executor"] = None
+
+        return state
+
+    def map(
+            self,
+            fn: Callable[[Any], Any],
+            items: Iterable[Any],
+    ) -> List[Any]:
+        if self.num_threads == 1:
+            return [fn(item) for item in items]
+
+        # threads of a pool do not survive fork (e.g., to DataLoader workers): one pool per process
+        if self.executor is None or self.executor_pid != os.getpid():
+            self.executor = ThreadPoolExecutor(max_workers=self.num_threads)
+            self.executor_pid = os.getpid()
+
+        return list(self.executor.map(fn, items))
+
+    def batch(
+            self,
+            paths: Iterable[str],
+    ) -> List[Union[Image.Image, torch.Tensor]]:
+        return self.map(self, paths)
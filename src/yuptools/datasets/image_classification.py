@@ -109,7 +109,7 @@ class Caltech101(ImageClassificationDataset):
 
         self.initialize(
             data=path_and_target,
-            targets=[target for _, target in path_and_target],
+            targets=None,
             class_labels=dataset.categories,
         )
 
@@ -148,7 +148,7 @@ class Caltech256(ImageClassificationDataset):
 
         self.initialize(
             data=path_and_target,
-            targets=[target for _, target in path_and_target],
+            targets=None,
             class_labels=dataset.categories,
         )
 
@@ -301,28 +301,32 @@ class ImageNet(ImageClassificationDataset):
             target_transform=target_transform,
         )
 
-        try:
-            _ = Dataset(
-                root=root,
-                split=split,
-                transform=None,
-                target_transform=None,
-                loader=None,
-            )
-        except RuntimeError:
-            pass
+        directory = os.path.join(
+            root,
+            split,
+        )
+
+        # torchvision ImageNet only to extract archives (it also scans the whole split)
+        if not os.path.isdir(directory):
+            try:
+                _ = Dataset(
+                    root=root,
+                    split=split,
+                    transform=None,
+                    target_transform=None,
+                    loader=None,
+                )
+            except RuntimeError:
+                pass
 
         path_and_target = self.make_dataset(
-            directory=os.path.join(
-                root,
-                split,
-            ),
+            directory=directory,
             extensions=["jpeg", ],
         )
 
         self.initialize(
             data=path_and_target,
-            targets=[target for _, target in path_and_target],
+            targets=None,
             class_labels=class_labels,
         )
 
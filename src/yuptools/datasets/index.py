@@ -0,0 +1,218 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import os
+import numpy as np
+
+__all__ = [
+    "scan_directory",
+    "PathIndex",
+]
+
+
+def directory_mtime(
+        directory: str,
+) -> float:
+    # adding/removing a class or a file of a class changes the mtime of its parent directory
+    mtimes = [os.stat(directory).st_mtime]
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                mtimes.append(entry.stat().st_mtime)
+
+    return max(mtimes)
+
+
+def index_path_of(
+        directory: str,
+) -> str:
+    # next to (not inside) the directory, so that writing it does not change the mtime of the directory
+    return f"{os.path.normpath(directory)}.index.npz"
+
+
+def path_index_of(
+        directory: str,
+        paths: np.ndarray,
+        targets: np.ndarray,
+) -> Optional["PathIndex"]:
+    # "\n"-separated UTF-8 paths relative to directory -> PathIndex, without decoding a single path
+    separators = np.flatnonzero(paths == 10)
+
+    if len(targets) == 0:
+        return PathIndex(directory, paths[:0], np.zeros(shape=(1,), dtype=np.int64), targets.astype(np.int32))
+
+    if len(separators) != len(targets) - 1:
+        return None
+
+    # ends of paths in the buffer without separators: the i-th separator moves back by i
+    offsets = np.zeros(shape=(len(targets) + 1,), dtype=np.int64)
+    offsets[1:-1] = separators - np.arange(len(separators))
+    offsets[-1] = len(paths) - len(separators)
+
+    return PathIndex(
+        root=directory,
+        buffer=paths[paths != 10],
+        offsets=offsets,
+        targets=targets.astype(np.int32),
+    )
+
+
+def load_index(
+        directory: str,
+        extensions: List[str],
+        mtime: float,
+) -> Optional["PathIndex"]:
+    index_path = index_path_of(directory)
+
+    if not os.path.exists(index_path):
+        return None
+
+    try:
+        with np.load(index_path) as index:
+            if float(index["mtime"]) != mtime \
+                    or index["extensions"].tolist() != list(extensions):
+                return None
+
+            paths = index["paths"]
+            targets = index["targets"]
+
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return path_index_of(directory, paths, targets)
+
+
+def save_index(
+        directory: str,
+        extensions: List[str],
+        mtime: float,
+        paths: np.ndarray,
+        targets: np.ndarray,
+) -> None:
+    index_path = index_path_of(directory)
+    tmp_path = f"{index_path}.tmp.npz"
+
+    try:
+        np.savez(
+            tmp_path,
+            mtime=np.float64(mtime),
+            extensions=np.array(list(extensions), dtype=str),
+            paths=paths,
+            targets=targets,
+        )
+
+        # atomic: a concurrent reader sees either no index or a complete one
+        os.replace(tmp_path, index_path)
+
+    # e.g., read-only dataset directory: scan again next time
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def scan_directory(
+        directory: str,
+        extensions: Iterable[str],
+        cache: bool = True,
+) -> "PathIndex":
+    from torchvision.datasets.folder import find_classes, make_dataset
+
+    extensions = list(extensions)
+    mtime = directory_mtime(directory)
+
+    # cached: the PathIndex is built from the saved buffer as is, with no per-path Python objects
+    if cache:
+        path_index = load_index(directory, extensions, mtime)
+
+        if path_index is not None:
+            return path_index
+
+    _, class_to_idx = find_classes(directory)
+
+    path_and_target = make_dataset(
+        directory=directory,
+        class_to_idx=class_to_idx,
+        extensions=extensions,
+        is_valid_file=None,
+    )
+
+    # paths relative to directory, "\n"-separated (as saved)
+    paths = np.frombuffer(
+        "\n".join(os.path.relpath(path, directory) for path, _ in path_and_target).encode("utf-8"),
+        dtype=np.uint8,
+    )
+    targets = np.array([target for _, target in path_and_target], dtype=np.int64)
+
+    if cache:
+        save_index(directory, extensions, mtime, paths, targets)
+
+    # (paths with "\n" cannot be split by separators)
+    path_index = path_index_of(directory, paths, targets)
+
+    return path_index if path_index is not None else PathIndex.from_list(path_and_target)
+
+
+# compact (path, target) index: paths in one contiguous byte buffer with offsets, targets in an int32 array.
+# a handful of numpy arrays instead of millions of Python objects,
+# so DataLoader workers forked from the main process do not copy its pages by touching refcounts
+class PathIndex:
+    def __init__(
+            self,
+            root: str,
+            buffer: np.ndarray,
+            offsets: np.ndarray,
+            targets: np.ndarray,
+    ) -> None:
+        assert len(offsets) == len(targets) + 1
+
+        self.root = root
+        self.buffer = buffer
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_list(
+            cls,
+            path_and_target: List[Tuple[str, int]],
+    ) -> "PathIndex":
+        # paths are stored relative to the deepest directory common to all of them
+        root = os.path.commonpath([os.path.dirname(path) for path, _ in path_and_target]) \
+            if len(path_and_target) else ""
+
+        paths = [os.path.relpath(path, root).encode("utf-8") for path, _ in path_and_target]
+
+        offsets = np.zeros(shape=(len(paths) + 1,), dtype=np.int64)
+        np.cumsum([len(path) for path in paths], out=offsets[1:])
+
+        return cls(
+            root=root,
+            buffer=np.frombuffer(b"".join(paths), dtype=np.uint8),
+            offsets=offsets,
+            targets=np.array([target for _, target in path_and_target], dtype=np.int32),
+        )
+
+    def path(
+            self,
+            index: int,
+    ) -> str:
+        start, end = self.offsets[index], self.offsets[index + 1]
+
+        return os.path.join(self.root, self.buffer[start:end].tobytes().decode("utf-8"))
+
+    def __getitem__(
+            self,
+            index: int,
+    ) -> Tuple[str, int]:
+        return self.path(index), int(self.targets[index])
+
+    def __len__(
+            self,
+    ) -> int:
+        return len(self.targets)
+
+    def __iter__(
+            self,
+    ) -> Iterator[Tuple[str, int]]:
+        for i in range(len(self)):
+            yield self[i]
+
@@ -0,0 +1,195 @@
+from typing import Iterable, List, Optional, Tuple
+
+import hashlib
+import os
+import numpy as np
+from PIL import Image
+import torch
+from torch.utils.data import DataLoader
+import tqdm
+import yaml
+
+__all__ = [
+    "PackedImages",
+    "pack_images",
+    "paths_hash",
+]
+
+index_dtype = np.dtype([
+    ("offset", "<i8"),
+    ("height", "<i4"),
+    ("width", "<i4"),
+    ("channels", "<i4"),
+])
+
+
+class DecodedImages:
+    def __init__(
+            self,
+            paths: Iterable[str],
+            size: Optional[Tuple[int, int]] = None,
+            channel: str = "RGB",
+    ) -> None:
+        self.paths = list(paths)
+        self.size = size
+        self.channel = channel
+
+    def __getitem__(
+            self,
+            index: int,
+    ) -> np.ndarray:
+        image = Image.open(self.paths[index]).convert(self.channel)
+
+        # size: (height, width), as in torchvision.transforms.Resize
+        if self.size is not None:
+            image = image.resize(
+                (self.size[1], self.size[0]),
+                resample=Image.BILINEAR,
+            )
+
+        # (H, W, C) uint8
+        return np.asarray(image, dtype=np.uint8).reshape(image.height, image.width, -1)
+
+    def __len__(
+            self,
+    ) -> int:
+        return len(self.paths)
+
+
+def identity(
+        image: np.ndarray,
+) -> np.ndarray:
+    return image
+
+
+def paths_hash(
+        paths: List[str],
+) -> str:
+    # identity of the packed images (and their order), checked before a pack is reused
+    return hashlib.sha256("\n".join(paths).encode()).hexdigest()
+
+
+def pack_images(
+        paths: Iterable[str],
+        save_dir: str,
+        size: Optional[Tuple[int, int]] = None,
+        channel: str = "RGB",
+        num_workers: int = 0,
+        verbose: bool = False,
+) -> None:
+    from ..tools.pathtools import mkdir, join_path
+
+    mkdir(save_dir)
+
+    paths = list(paths)
+    meta_path = join_path([save_dir, "meta.yaml"])
+
+    # a pack without meta is incomplete: rebuilt from scratch
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    index = np.zeros(shape=(len(paths),), dtype=index_dtype)
+
+    dataloader = DataLoader(
+        dataset=DecodedImages(paths, size, channel),
+        batch_size=None,
+        shuffle=False,
+        num_workers=num_workers,
+        collate_fn=identity,
+    )
+
+    offset = 0
+
+    with open(join_path([save_dir, "data.bin"]), "wb") as f:
+        for i, image in enumerate(tqdm.tqdm(
+                dataloader,
+                desc=f"Packing images to {save_dir}",
+                disable=not verbose,
+        )):
+            f.write(np.ascontiguousarray(image).tobytes())
+
+            index[i] = (offset, *image.shape)
+            offset += image.size
+
+    index.tofile(join_path([save_dir, "index.bin"]))
+
+    # meta is written last
+    with open(meta_path, "w") as f:
+        yaml.dump({
+            "num_data": len(paths),
+            "size": list(size) if size is not None else None,
+            "channel": channel,
+            "nbytes": offset,
+            "paths_hash": paths_hash(paths),
+        }, f)
+
+
+# read-only view of images packed by pack_images:
+# samples are (C, H, W) uint8 tensors served zero-copy from a memory map
+class PackedImages:
+    def __init__(
+            self,
+            save_dir: str,
+    ) -> None:
+        from ..tools.pathtools import join_path
+
+        self.save_dir = save_dir
+        self.meta_path = join_path([save_dir, "meta.yaml"])
+        self.data_path = join_path([save_dir, "data.bin"])
+        self.index_path = join_path([save_dir, "index.bin"])
+
+        assert self.exists(save_dir), \
+            f"{save_dir} does not hold a complete pack; run pack_images first."
+
+        with open(self.meta_path, "r") as f:
+            self.meta = yaml.load(f, Loader=yaml.FullLoader)
+
+        self.index = np.fromfile(self.index_path, dtype=index_dtype)
+
+        # opened lazily in each process (memmaps must not be pickled to workers)
+        self._data = None
+
+    @staticmethod
+    def exists(
+            save_dir: str,
+    ) -> bool:
+        return os.path.exists(os.path.join(save_dir, "meta.yaml"))
+
+    @property
+    def data(
+            self,
+    ) -> np.ndarray:
+        # copy-on-write: pages are shared and never copied unless a sample is modified in place
+        if self._data is None:
+            self._data = np.memmap(
+                self.data_path,
+                dtype=np.uint8,
+                mode="c",
+                shape=(self.meta["nbytes"],),
+            )
+
+        return self._data
+
+    def __getstate__(
+            self,
+    ) -> dict:
+        state = self.__dict__.copy()
+        state["_data"] = None
+
+        return state
+
+    def __getitem__(
+            self,
+            index: int,
+    ) -> torch.Tensor:
+        offset, height, width, channels = self.index[index].tolist()
+
+        image = self.data[offset:offset + height * width * channels].reshape(height, width, channels)
+
+        # (H, W, C) -> (C, H, W) view, as torchvision-decoded images
+        return torch.from_numpy(image).permute(2, 0, 1)
+
+    def __len__(
+            self,
+    ) -> int:
+        return len(self.index)
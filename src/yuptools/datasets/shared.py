@@ -0,0 +1,44 @@
+import hashlib
+import os
+import numpy as np
+
+__all__ = [
+    "share_array",
+    "open_shared_array",
+]
+
+
+def share_array(
+        array: np.ndarray,
+        shared_dir: str,
+        name: str,
+) -> str:
+    from ..tools.pathtools import mkdir, join_path
+
+    mkdir(shared_dir)
+
+    array = np.ascontiguousarray(array)
+
+    # same content -> same file: written once, reused by every process that shares it
+    sha = hashlib.blake2b(digest_size=8)
+    sha.update(str((array.shape, array.dtype.str)).encode())
+    sha.update(memoryview(array).cast("B"))
+
+    path = join_path([shared_dir, f"{name}-{sha.hexdigest()}.npy"])
+
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        np.save(tmp_path, array, allow_pickle=False)
+
+        # atomic: concurrent processes see either no file or a complete one
+        os.replace(f"{tmp_path}.npy", path)
+
+    return path
+
+
+def open_shared_array(
+        path: str,
+) -> np.ndarray:
+    # copy-on-write memory map: one physical copy (page cache) shared by all processes
+    return np.load(path, mmap_mode="c", allow_pickle=False)
@@ -0,0 +1,100 @@
+from typing import Iterable, Tuple
+
+import math
+import torch
+
+__all__ = [
+    "Statistics",
+    "SampleStatistics",
+]
+
+
+# streaming per-channel count, mean, and sum of squared deviations (M2),
+# merged across chunks/workers with the parallel algorithm of Chan et al.
+class Statistics:
+    def __init__(
+            self,
+    ) -> None:
+        self.count = torch.zeros(size=(), dtype=torch.float64)
+        self.mean = torch.zeros(size=(), dtype=torch.float64)
+        self.m2 = torch.zeros(size=(), dtype=torch.float64)
+
+    @staticmethod
+    def of(
+            data: torch.Tensor,
+            dims: Iterable[int],
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        dims = tuple(dims)
+        data = data.to(torch.float64)
+
+        count = torch.tensor(float(math.prod(data.shape[dim] for dim in dims)), dtype=torch.float64)
+
+        mean = data.mean(dim=dims, keepdim=True)
+        m2 = ((data - mean) ** 2).sum(dim=dims)
+
+        return count, mean.reshape(m2.shape), m2
+
+    def update(
+            self,
+            count: torch.Tensor,
+            mean: torch.Tensor,
+            m2: torch.Tensor,
+    ) -> None:
+        # count, mean, m2: (B, ...) statistics of B chunks, merged into one first
+        count = count.to(torch.float64)
+        mean = mean.to(torch.float64)
+        m2 = m2.to(torch.float64)
+
+        weights = count.reshape(-1, *[1] * (mean.dim() - 1))
+
+        _count = count.sum()
+        _mean = (weights * mean).sum(dim=0) / _count
+        _m2 = m2.sum(dim=0) + (weights * (mean - _mean) ** 2).sum(dim=0)
+
+        self.merge(_count, _mean, _m2)
+
+    def merge(
+            self,
+            count: torch.Tensor,
+            mean: torch.Tensor,
+            m2: torch.Tensor,
+    ) -> None:
+        total = self.count + count
+        delta = mean - self.mean
+
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def mean_and_std(
+            self,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        # unbiased, as torch.std
+        std = torch.sqrt(self.m2 / (self.count - 1))
+
+        return self.mean.to(torch.float32), std.to(torch.float32)
+
+
+# dataset of per-sample statistics of (C, ...) samples of a dataset over all but the channel dimension:
+# computed inside DataLoader workers, so that only (C,)-sized statistics leave them
+class SampleStatistics:
+    def __init__(
+            self,
+            dataset,
+    ) -> None:
+        self.dataset = dataset
+
+    def __getitem__(
+            self,
+            index: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        data, _ = self.dataset[index]
+
+        data = torch.as_tensor(data)
+
+        return Statistics.of(data, dims=range(1, data.dim()))
+
+    def __len__(
+            self,
+    ) -> int:
+        return len(self.dataset)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Sequence
 
 from torchvision import transforms as tf
 
@@ -42,11 +42,13 @@ class CIFAR10ClassificationModel(ImageClassificationModel):
 
     def add_normalize_in_front(
             self,
+            mean: Optional[Sequence[float]] = None,
+            std: Optional[Sequence[float]] = None,
     ) -> None:
         self.merge_preprocess(
             preprocess=tf.Normalize(
-                mean=[0.4942, 0.4851, 0.4504],
-                std=[0.2467, 0.2429, 0.2616],
+                mean=[0.4942, 0.4851, 0.4504] if mean is None else mean,
+                std=[0.2467, 0.2429, 0.2616] if std is None else std,
             )
         )
 
@@ -81,11 +83,13 @@ class CIFAR100ClassificationModel(ImageClassificationModel):
 
     def add_normalize_in_front(
             self,
+            mean: Optional[Sequence[float]] = None,
+            std: Optional[Sequence[float]] = None,
     ) -> None:
         self.merge_preprocess(
             preprocess=tf.Normalize(
-                mean=[0.5071, 0.4865, 0.4409],
-                std=[0.2673, 0.2564, 0.2762],
+                mean=[0.5071, 0.4865, 0.4409] if mean is None else mean,
+                std=[0.2673, 0.2564, 0.2762] if std is None else std,
             )
         )
 
@@ -111,10 +115,12 @@ class ImageNetClassificationModel(ImageClassificationModel):
 
     def add_normalize_in_front(
             self,
+            mean: Optional[Sequence[float]] = None,
+            std: Optional[Sequence[float]] = None,
     ) -> None:
         self.merge_preprocess(
             preprocess=tf.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225],
+                mean=[0.485, 0.456, 0.406] if mean is None else mean,
+                std=[0.229, 0.224, 0.225] if std is None else std,
             )
         )
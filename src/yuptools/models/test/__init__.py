@@ -1,3 +1,4 @@
 from .accuracy import *
 from .calibration import *
 from .linearity import *
+from .robustness import *
@@ -0,0 +1,201 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import resource
+import time
+import torch
+from torch.utils.data import DataLoader
+import tqdm
+
+__all__ = [
+    "RobustnessTest",
+]
+
+robustness_attacks = [
+    "fgsm",
+    "ifgsm",
+    "pgd",
+]
+
+
+def peak_memory(
+        machine: str,
+) -> int:
+    # in bytes
+    if machine == "cuda":
+        return torch.cuda.max_memory_allocated()
+
+    else:
+        # ru_maxrss: peak resident set size in kilobytes (Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RobustnessTest:
+    def __init__(
+            self,
+            epsilons: Iterable[float],
+            attack: str = "fgsm",
+            attack_kwargs: Optional[Dict[str, Any]] = None,
+            batch_size: int = 64,
+            num_workers: int = 0,
+            pin_memory: bool = False,
+            save_dir: Optional[str] = None,
+            save_dtype: str = "float16",
+            use_cuda: bool = False,
+            verbose: bool = False,
+    ) -> None:
+        assert attack in robustness_attacks, \
+            f"Unsupported attack {attack}.\n" \
+            f"Supported attacks: {robustness_attacks}"
+
+        if not isinstance(epsilons, list):
+            epsilons = list(epsilons)
+
+        self.epsilons = epsilons
+        self.attack = attack
+        self.attack_kwargs = attack_kwargs if attack_kwargs is not None else dict()
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.pin_memory = pin_memory
+        self.save_dir = save_dir
+        self.save_dtype = save_dtype
+        self.use_cuda = use_cuda
+        self.machine = "cuda" if use_cuda else "cpu"
+        self.verbose = verbose
+
+    def __call__(
+            self,
+            dataset,
+            model: torch.nn.Module,
+    ) -> Dict[str, Any]:
+        dataloader = DataLoader(
+            dataset=dataset,
+            batch_size=self.batch_size,
+            shuffle=False,
+            num_workers=self.num_workers,
+            pin_memory=self.pin_memory,
+        )
+
+        stores = self.init_stores(dataset) if self.save_dir is not None else None
+
+        if self.use_cuda:
+            torch.cuda.reset_peak_memory_stats()
+
+        clean_acc = 0.
+        adv_accs = [0. for _ in self.epsilons]
+        start = 0
+
+        tic = time.time()
+
+        for (data, targets) in tqdm.tqdm(
+                dataloader,
+                desc=f"Robustness Test ({self.attack})",
+                disable=not self.verbose,
+        ):
+            data = data.to(self.machine, non_blocking=self.pin_memory)
+            targets = targets.to(self.machine, non_blocking=self.pin_memory)
+
+            with torch.no_grad():
+                preds = torch.argmax(model(data), dim=-1)
+
+            clean_acc += float(preds.eq(targets).sum().detach().to("cpu"))
+
+            for i, (epsilon, preds, _data) in enumerate(self.attack_batch(model, data, targets)):
+                adv_accs[i] += float(preds.eq(targets.to("cpu")).sum())
+
+                if stores is not None:
+                    stores[i].write(range(start, start + len(data)), self.to_save(data, _data))
+
+            start += len(data)
+
+        elapsed = time.time() - tic
+
+        num_data = len(dataloader.dataset)
+
+        return {
+            "num_data": num_data,
+            "epsilons": self.epsilons,
+            "clean_acc": clean_acc / num_data,
+            "adv_accs": [acc / num_data for acc in adv_accs],
+            "images_per_sec": num_data / elapsed,
+            "peak_memory": peak_memory(self.machine),
+        }
+
+    def init_stores(
+            self,
+            dataset,
+    ) -> List:
+        from ...attacks.store import AdversarialStore
+        from ...tools.pathtools import join_path
+
+        data, _ = dataset[0]
+
+        return [
+            AdversarialStore(
+                save_dir=join_path([self.save_dir, self.attack, f"epsilon={epsilon}"]),
+                num_data=len(dataset),
+                shape=data.shape,
+                dtype=self.save_dtype,
+            ) for epsilon in self.epsilons
+        ]
+
+    def to_save(
+            self,
+            data: torch.Tensor,
+            _data: torch.Tensor,
+    ) -> torch.Tensor:
+        from ...attacks.store import half_toward_zero
+
+        # float16: perturbations (rounded toward zero, so they stay in the epsilon-ball), added to data on reuse;
+        # uint8: adversarial data, exact only on the k / 255 grid (checked by the store)
+        if self.save_dtype == "float16":
+            return half_toward_zero(_data - data.to("cpu"))
+
+        return _data
+
+    def attack_batch(
+            self,
+            model: torch.nn.Module,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> Iterator[Tuple[float, torch.Tensor, Optional[torch.Tensor]]]:
+        from ...attacks import FGSM, IFGSM, PGD
+
+        return_data = self.save_dir is not None
+
+        # FGSM: a single gradient for all epsilons
+        if self.attack == "fgsm":
+            results = FGSM(
+                model=model,
+                epsilon=0.,
+                use_cuda=self.use_cuda,
+                **self.attack_kwargs,
+            ).sweep(
+                data=data,
+                targets=targets,
+                epsilons=self.epsilons,
+                batch_size=self.batch_size,
+                return_data=return_data,
+            )
+
+            for i, epsilon in enumerate(self.epsilons):
+                yield epsilon, results["preds"][i], results["data"][i] if return_data else None
+
+            return
+
+        attack = {
+            "ifgsm": IFGSM,
+            "pgd": PGD,
+        }[self.attack]
+
+        for epsilon in self.epsilons:
+            _data = attack(
+                model=model,
+                epsilon=epsilon,
+                use_cuda=self.use_cuda,
+                **self.attack_kwargs,
+            )(data, targets)
+
+            with torch.no_grad():
+                preds = torch.argmax(model(_data.to(self.machine)), dim=-1).to("cpu")
+
+            yield epsilon, preds, _data
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Optional, Union
 
 import torch
 
@@ -43,18 +43,23 @@ def proj_v1_to_v2(
 def orthogonal_to_v(
         v: torch.Tensor,
         seed: int = None,
+        generator: Optional[torch.Generator] = None,
 ) -> torch.Tensor:
-    from .randtools import set_random_seed, unset_random_seed
+    from .randtools import make_generator
 
     assert len(v.shape) == 1
 
-    set_random_seed(seed)
+    if generator is None:
+        generator = make_generator(seed, v.device)
 
-    rand_v = torch.randn_like(v)
+    rand_v = torch.randn(
+        size=v.shape,
+        generator=generator,
+        dtype=v.dtype,
+        device=v.device,
+    )
     proj_v = proj_v1_to_v2(rand_v, v)
 
-    unset_random_seed()
-
     return rand_v - proj_v
 
 
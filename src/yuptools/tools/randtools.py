@@ -1,3 +1,6 @@
+from typing import Iterator, Optional, Union
+
+from contextlib import contextmanager
 import numpy as np
 import random
 import time
@@ -6,6 +9,9 @@ import torch
 __all__ = [
     "set_random_seed",
     "unset_random_seed",
+    "make_generator",
+    "is_stochastic",
+    "local_random_seed",
 ]
 
 
@@ -27,3 +33,60 @@ def unset_random_seed() -> None:
     random.seed(seed)
     torch.manual_seed(seed)
     torch.cuda.manual_seed(seed)
+
+
+def make_generator(
+        seed: Optional[int] = None,
+        device: Union[str, torch.device] = "cpu",
+) -> torch.Generator:
+    generator = torch.Generator(device=device)
+
+    if seed is not None:
+        generator.manual_seed(seed)
+    else:
+        generator.seed()
+
+    return generator
+
+
+def is_stochastic(
+        model: torch.nn.Module,
+) -> bool:
+    # modules drawing from the global RNGs in their forward pass (dropout and RReLU, in training mode only)
+    return any(
+        module.training and isinstance(module, (torch.nn.modules.dropout._DropoutNd, torch.nn.RReLU))
+        for module in model.modules()
+    )
+
+
+@contextmanager
+def local_random_seed(
+        seed: Optional[int] = None,
+) -> Iterator[None]:
+    # for randomness that cannot take a generator (e.g., dropout in a model):
+    # seeds the global RNGs inside the context and restores their states on exit.
+    # does nothing if seed is None, so unseeded calls never touch global state.
+    # global state is shared by all threads: not thread-safe when seed is set.
+    if seed is None:
+        yield
+        return
+
+    np_state = np.random.get_state()
+    py_state = random.getstate()
+    devices = list(range(torch.cuda.device_count())) if torch.cuda.is_initialized() else []
+
+    with torch.random.fork_rng(devices=devices):
+        # not set_random_seed (or torch.manual_seed): CUDA seeds set before CUDA is initialized are queued
+        # and applied at a later initialization, outside the context; CUDA is seeded only if initialized
+        np.random.seed(seed)
+        random.seed(seed)
+        torch.default_generator.manual_seed(seed)
+
+        if devices:
+            torch.cuda.manual_seed_all(seed)
+
+        try:
+            yield
+        finally:
+            np.random.set_state(np_state)
+            random.setstate(py_state)
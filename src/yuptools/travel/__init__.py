@@ -1,3 +1,5 @@
 from .direction import *
 from .footprint import *
+from .landscape import *
+from .runner import *
 from .travel import *
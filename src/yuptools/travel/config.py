@@ -1,10 +1,14 @@
 __all__ = [
     "direction_generation_methods",
     "direction_normalize_methods",
+    "travel_search_methods",
+    "footprint_outputs",
 
     "default_method",
     "default_normalize",
     "default_seed",
+    "default_search",
+    "default_footprint_outputs",
 
     "eps_for_incorrect",
     "eps_for_divergence",
@@ -25,9 +29,22 @@ direction_normalize_methods = [
     "unit",
 ]
 
+travel_search_methods = [
+    "stride",
+    "bisection",
+]
+
+footprint_outputs = [
+    "logits",
+    "preds",
+    "confs",
+]
+
 default_method = "fgsm"
 default_normalize = "dim"
 default_seed = None
+default_search = "stride"
+default_footprint_outputs = ["preds", "confs", ]
 
 # invalids: must be negative
 eps_for_incorrect = -1.
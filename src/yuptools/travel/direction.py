@@ -21,27 +21,31 @@ def random_direction(
         data: torch.Tensor,
         signed: bool = False,
         seed: Optional[int] = None,
+        per_sample: bool = False,
+        generator: Optional[torch.Generator] = None,
 ) -> torch.Tensor:
-    from ..tools.linalgtools import repeat_tensor
-    from ..tools.randtools import set_random_seed, unset_random_seed
+    from ..tools.randtools import make_generator
 
-    num_data = len(data)
+    if generator is None:
+        generator = make_generator(seed, data.device)
 
-    set_random_seed(seed)
+    # independent direction for each sample in one draw,
+    # or a single direction shared (expanded, not copied) across the batch
+    shape = data.shape if per_sample else data.shape[1:]
 
-    direction = torch.randn_like(data[0])
+    direction = torch.randn(
+        size=shape,
+        generator=generator,
+        dtype=data.dtype,
+        device=data.device,
+    )
 
     if signed:
         direction = direction > 0
         direction = (direction.int() - 0.5).sign()
 
-    direction = repeat_tensor(
-        tensor=direction,
-        repeat=num_data,
-        dim=0,
-    )
-
-    unset_random_seed()
+    if not per_sample:
+        direction = direction[None, ...].expand_as(data)
 
     return direction
 
@@ -51,12 +55,40 @@ def post_process(
         perp: bool = False,
         normalize: Optional[str] = default_normalize,
         seed: Optional[int] = None,
+        per_sample: bool = False,
+        inplace: bool = False,
 ) -> torch.Tensor:
     from ..tools.linalgtools import normalize_v, orthogonal_to_v
 
     # assertions
     is_valid_direction_normalize_method(normalize)
 
+    if per_sample:
+        return post_process_per_sample(
+            direction=direction,
+            perp=perp,
+            normalize=normalize,
+            seed=seed,
+            inplace=inplace,
+        )
+
+    # a direction shared (expanded) across the batch is post-processed once and expanded again,
+    # which equals post-processing the whole batch: the norm of the batch is sqrt(N) times that of one direction.
+    # (perp draws a vector orthogonal to the whole batch, which is not shared)
+    if not perp and direction.dim() > 1 and direction.stride(0) == 0:
+        num_data = len(direction)
+
+        shared = post_process(
+            direction=direction[0].contiguous(),
+            perp=False,
+            normalize=normalize,
+        )
+
+        if normalize == "unit":
+            shared = shared / num_data ** 0.5
+
+        return shared[None, ...].expand_as(direction)
+
     shape = direction.shape
     direction = direction.reshape(-1)
 
@@ -84,6 +116,53 @@ def post_process(
     return direction
 
 
+def post_process_per_sample(
+        direction: torch.Tensor,
+        perp: bool = False,
+        normalize: Optional[str] = default_normalize,
+        seed: Optional[int] = None,
+        inplace: bool = False,
+) -> torch.Tensor:
+    shape = direction.shape
+
+    # (N, D): one row per sample
+    if not inplace:
+        direction = direction.clone()
+
+    direction = direction.reshape(len(direction), -1)
+
+    # perpendicular: row-wise Gram-Schmidt of random vectors against directions
+    if perp:
+        from ..tools.randtools import make_generator
+
+        generator = make_generator(seed, direction.device)
+
+        rand_v = torch.randn(
+            size=direction.shape,
+            generator=generator,
+            dtype=direction.dtype,
+            device=direction.device,
+        )
+
+        coef = (rand_v * direction).sum(dim=-1, keepdim=True) / \
+            (direction * direction).sum(dim=-1, keepdim=True)
+
+        direction = direction.mul_(-coef).add_(rand_v)
+
+    # normalize
+    if normalize is not None:
+        # normalize == "unit"
+        direction = direction.div_(torch.norm(direction, p=2, dim=-1, keepdim=True))
+
+        # normalize == "dim"
+        if normalize == "dim":
+            direction = direction.mul_(direction.shape[-1] ** 0.5)
+
+    direction = direction.reshape(shape)
+
+    return direction
+
+
 class DirectionGenerator:
     def __init__(
             self,
@@ -93,6 +172,7 @@ class DirectionGenerator:
             normalize: Optional[str] = default_normalize,
             seed: Optional[int] = default_seed,
             use_cuda: bool = False,
+            per_sample: bool = False,
     ) -> None:
         # assertions
         is_valid_direction_method(method)
@@ -104,6 +184,7 @@ class DirectionGenerator:
         self.seed = seed
         self.use_cuda = use_cuda
         self.machine = "cuda" if use_cuda else "cpu"
+        self.per_sample = per_sample
 
         DirectionGenerator.__name__ = \
             f"{self.method}(" \
@@ -117,6 +198,89 @@ class DirectionGenerator:
             data: torch.Tensor,
             targets: Optional[torch.Tensor] = None,
             destinations: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        direction = self.generate(
+            data=data,
+            targets=targets,
+            destinations=destinations,
+        )
+
+        direction = post_process(
+            direction=direction,
+            perp=self.perp,
+            normalize=self.normalize,
+            seed=self.seed + 1 if isinstance(self.seed, int) else self.seed,
+            per_sample=self.per_sample,
+            # per-sample directions are never views of the input data,
+            # so they can be post-processed in place
+            inplace=self.per_sample,
+        )
+
+        return direction
+
+    def basis(
+            self,
+            data: torch.Tensor,
+            k: int,
+            targets: Optional[torch.Tensor] = None,
+            destinations: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        assert k > 0
+
+        direction = self.generate(
+            data=data,
+            targets=targets,
+            destinations=destinations,
+        )
+
+        num_data = len(direction)
+        shape = direction.shape[1:]
+
+        # (N, D, k): generated direction followed by k - 1 random vectors
+        direction = direction.reshape(num_data, -1, 1)
+
+        assert k <= direction.shape[1], \
+            f"Cannot generate {k} orthonormal directions in {direction.shape[1]} dimensions " \
+            f"(data of shape {tuple(shape)}); k must be at most {direction.shape[1]}."
+
+        from ..tools.randtools import make_generator
+
+        generator = make_generator(
+            seed=self.seed + 1 if isinstance(self.seed, int) else self.seed,
+            device=direction.device,
+        )
+
+        rand_v = torch.randn(
+            size=(num_data, direction.shape[1], k - 1),
+            generator=generator,
+            dtype=direction.dtype,
+            device=direction.device,
+        )
+
+        # one batched (reduced) QR decomposition for all samples:
+        # columns of q are orthonormal, and the first one spans the generated direction
+        q, r = torch.linalg.qr(torch.cat([direction, rand_v], dim=-1))
+
+        # fix signs so that the first column points along the generated direction
+        signs = torch.diagonal(r, dim1=-2, dim2=-1).sign()
+        signs[signs == 0] = 1
+        q = q * signs[:, None, :]
+
+        # normalize == "unit": q as is
+        if self.normalize is None:
+            q = q * torch.norm(direction, p=2, dim=1, keepdim=True)
+
+        elif self.normalize == "dim":
+            q = q * q.shape[1] ** 0.5
+
+        # (N, k, ...)
+        return q.transpose(1, 2).reshape(num_data, k, *shape)
+
+    def generate(
+            self,
+            data: torch.Tensor,
+            targets: Optional[torch.Tensor] = None,
+            destinations: Optional[torch.Tensor] = None,
     ) -> torch.Tensor:
         assert data is not None
 
@@ -165,6 +329,7 @@ class DirectionGenerator:
                 data=data,
                 signed=False,
                 seed=self.seed,
+                per_sample=self.per_sample,
             )
 
         elif self.method == "random_signed":
@@ -172,16 +337,10 @@ class DirectionGenerator:
                 data=data,
                 signed=True,
                 seed=self.seed,
+                per_sample=self.per_sample,
             )
 
         else:
             raise
 
-        direction = post_process(
-            direction=direction,
-            perp=self.perp,
-            normalize=self.normalize,
-            seed=self.seed + 1 if isinstance(self.seed, int) else self.seed,
-        )
-
         return direction
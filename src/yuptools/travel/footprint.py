@@ -1,8 +1,9 @@
-from typing import Optional
+from typing import Dict, Iterable, Iterator, Optional
 
 import torch
 
 from .config import *
+from .warnings import *
 
 __all__ = [
     "Footprint",
@@ -20,6 +21,7 @@ class Footprint:
             bound: bool = False,
             seed: Optional[int] = default_seed,
             use_cuda: bool = False,
+            per_sample: bool = False,
     ) -> None:
         from .direction import DirectionGenerator
 
@@ -31,6 +33,8 @@ class Footprint:
         self.bound = bound
         self.seed = seed
         self.use_cuda = use_cuda
+        self.machine = "cuda" if use_cuda else "cpu"
+        self.per_sample = per_sample
 
         self.direction_generator = DirectionGenerator(
             model=model,
@@ -39,6 +43,7 @@ class Footprint:
             normalize=normalize,
             seed=seed,
             use_cuda=use_cuda,
+            per_sample=per_sample,
         )
 
         Footprint.__name__ = \
@@ -63,48 +68,197 @@ class Footprint:
             destinations=destinations,
         )
 
-        footprints = []
+        return self.generate_footprints(
+            data=data,
+            directions=directions,
+            epsilons=epsilons,
+        )
 
-        for i in range(len(data)):
-            footprints.append(
-                self.generate_footprints(
-                    data=data[i],
-                    direction=directions[i],
-                    epsilon=epsilons[i],
-                ).unsqueeze(dim=0)
-            )
+    def stream(
+            self,
+            data: torch.Tensor,
+            epsilons: torch.Tensor,
+            targets: Optional[torch.Tensor] = None,
+            destinations: Optional[torch.Tensor] = None,
+            chunk_size: int = 1,
+    ) -> Iterator[torch.Tensor]:
+        assert chunk_size > 0
 
-        return torch.cat(footprints, dim=0)
+        directions = self.direction_generator(
+            data=data,
+            targets=targets,
+            destinations=destinations,
+        )
 
-    def generate_footprints(
+        for start in range(0, self.step + 1, chunk_size):
+            yield self.generate_footprints(
+                data=data,
+                directions=directions,
+                epsilons=epsilons,
+                start=start,
+                end=min(start + chunk_size, self.step + 1),
+            )
+
+    def evaluate(
             self,
             data: torch.Tensor,
-            direction: torch.Tensor,
-            epsilon: float,
-    ) -> torch.Tensor:
-        from ..tools.linalgtools import repeat_tensor
+            epsilons: torch.Tensor,
+            targets: Optional[torch.Tensor] = None,
+            destinations: Optional[torch.Tensor] = None,
+            batch_size: int = 64,
+            outputs: Iterable[str] = default_footprint_outputs,
+    ) -> Dict[str, torch.Tensor]:
+        directions = self.direction_generator(
+            data=data,
+            targets=targets,
+            destinations=destinations,
+        )
 
-        footprints = repeat_tensor(
-            tensor=data,
-            repeat=self.step + 1,
-            dim=0,
+        return self.evaluate_footprints(
+            data=data,
+            directions=directions,
+            epsilons=epsilons,
+            targets=targets,
+            batch_size=batch_size,
+            outputs=outputs,
         )
-        footprints_shape = footprints.shape
 
-        if epsilon < 0:
-            return torch.ones_like(footprints) * invalid_footprint_val
+    @torch.no_grad()
+    def evaluate_footprints(
+            self,
+            data: torch.Tensor,
+            directions: torch.Tensor,
+            epsilons: torch.Tensor,
+            targets: Optional[torch.Tensor] = None,
+            batch_size: int = 64,
+            outputs: Iterable[str] = default_footprint_outputs,
+    ) -> Dict[str, torch.Tensor]:
+        # assertions
+        for output in outputs:
+            is_valid_footprint_output(output)
 
-        directions = repeat_tensor(
-            tensor=direction,
-            repeat=self.step + 1,
-            dim=0,
-        ).reshape(self.step + 1, -1)
+        assert batch_size > 0
+        assert "confs" not in outputs or targets is not None
 
-        strides = torch.linspace(0., epsilon, self.step + 1)
+        data = data.detach().to(self.machine)
+        directions = directions.detach().to(self.machine)
+        epsilons = torch.as_tensor(epsilons, dtype=data.dtype).to(self.machine)
 
-        footprints += (directions.T * strides).T.reshape(footprints_shape)
+        num_data = len(data)
+        num_steps = self.step + 1
+
+        # only footprints of valid epsilons are evaluated,
+        # walking (sample, step) points in batches of batch_size
+        valids = (epsilons >= 0).nonzero().squeeze(dim=-1)
+        num_points = len(valids) * num_steps
+
+        results = {}
+
+        for start in range(0, num_points, batch_size):
+            points = torch.arange(
+                start, min(start + batch_size, num_points),
+                device=self.machine,
+            )
+            samples = valids[points // num_steps]
+            steps = points % num_steps
+
+            strides = epsilons[samples] * self.strides(steps).to(data.dtype)
+            footprints = data[samples] + \
+                strides.reshape(-1, *[1] * (data.dim() - 1)) * directions[samples]
+
+            if self.bound:
+                footprints = footprints.clamp(0, 1)
+
+            logits = self.model(footprints).detach()
+
+            if not len(results):
+                results = self.init_results(
+                    num_data=num_data,
+                    num_classes=logits.shape[-1],
+                    outputs=outputs,
+                )
+
+            if "logits" in outputs:
+                results["logits"][samples, steps] = logits.to(results["logits"])
+
+            if "preds" in outputs:
+                results["preds"][samples, steps] = torch.argmax(logits, dim=-1)
+
+            if "confs" in outputs:
+                confs = torch.nn.Softmax(dim=-1)(logits)
+                results["confs"][samples, steps] = \
+                    confs.gather(-1, targets.to(self.machine)[samples][:, None])[:, 0]
+
+        if not len(results):
+            results = self.init_results(
+                num_data=num_data,
+                num_classes=0,
+                outputs=outputs,
+            )
+
+        return {output: result.to("cpu") for output, result in results.items()}
+
+    def init_results(
+            self,
+            num_data: int,
+            num_classes: int,
+            outputs: Iterable[str],
+    ) -> Dict[str, torch.Tensor]:
+        shapes = {
+            "logits": (num_data, self.step + 1, num_classes),
+            "preds": (num_data, self.step + 1),
+            "confs": (num_data, self.step + 1),
+        }
+        dtypes = {
+            "logits": torch.float32,
+            "preds": torch.int64,
+            "confs": torch.float32,
+        }
+
+        return {
+            output: torch.full(
+                size=shapes[output],
+                fill_value=invalid_footprint_val,
+                dtype=dtypes[output],
+                device=self.machine,
+            ) for output in outputs
+        }
+
+    def strides(
+            self,
+            steps: torch.Tensor,
+    ) -> torch.Tensor:
+        # position of each step on the footprint line, in [0, 1]
+        return steps / max(self.step, 1)
+
+    def generate_footprints(
+            self,
+            data: torch.Tensor,
+            directions: torch.Tensor,
+            epsilons: torch.Tensor,
+            start: int = 0,
+            end: Optional[int] = None,
+    ) -> torch.Tensor:
+        if end is None:
+            end = self.step + 1
+
+        epsilons = torch.as_tensor(epsilons, dtype=data.dtype, device=data.device)
+        directions = directions.to(data.device)
+
+        # (N, end - start): strides of each sample along its direction
+        strides = self.strides(
+            steps=torch.arange(start, end, device=data.device),
+        ).to(data.dtype)
+        strides = epsilons[:, None] * strides[None, :]
+
+        # (N, end - start, ...): broadcasted outer product of strides and directions
+        shape = (*strides.shape, *[1] * (data.dim() - 1))
+        footprints = data[:, None] + strides.reshape(shape) * directions[:, None]
 
         if self.bound:
             footprints = footprints.clamp(0, 1)
 
+        invalids = epsilons < 0
+        footprints[invalids] = invalid_footprint_val
+
         return footprints
@@ -0,0 +1,238 @@
+from typing import Dict, Optional, Tuple
+
+import torch
+
+from .config import *
+
+__all__ = [
+    "Landscape",
+]
+
+
+class Landscape:
+    def __init__(
+            self,
+            model: torch.nn.Module,
+            radius: float,
+            grid: int = 33,
+            refine: int = 0,
+            method: str = default_method,
+            normalize: Optional[str] = default_normalize,
+            bound: bool = False,
+            seed: Optional[int] = default_seed,
+            use_cuda: bool = False,
+            per_sample: bool = False,
+            batch_size: int = 64,
+    ) -> None:
+        from .direction import DirectionGenerator
+
+        assert radius > 0
+        assert grid > 1 and refine >= 0
+        assert (grid - 1) % 2 ** refine == 0, \
+            f"(grid - 1) must be divisible by 2 ** refine, " \
+            f"got grid={grid} and refine={refine}."
+        assert batch_size > 0
+
+        self.model = model
+        self.radius = radius
+        self.grid = grid
+        self.refine = refine
+        self.method = method
+        self.normalize = normalize
+        self.bound = bound
+        self.seed = seed
+        self.use_cuda = use_cuda
+        self.machine = "cuda" if use_cuda else "cpu"
+        self.per_sample = per_sample
+        self.batch_size = batch_size
+
+        self.direction_generator = DirectionGenerator(
+            model=model,
+            method=method,
+            perp=False,
+            normalize=normalize,
+            seed=seed,
+            use_cuda=use_cuda,
+            per_sample=per_sample,
+        )
+
+        # number of model evaluations (points) of the last call
+        self.num_evaluations = 0
+
+        Landscape.__name__ = \
+            f"{self.method}_landscape(" \
+            f"radius={self.radius}, " \
+            f"grid={self.grid}, " \
+            f"refine={self.refine}, " \
+            f"normalize={self.normalize}, " \
+            f"bound={self.bound}, " \
+            f"seed={self.seed}" \
+            f")"
+
+    def __call__(
+            self,
+            data: torch.Tensor,
+            targets: Optional[torch.Tensor] = None,
+            destinations: Optional[torch.Tensor] = None,
+            directions: Optional[torch.Tensor] = None,
+    ) -> Dict[str, torch.Tensor]:
+        # (N, 2, ...): two orthogonal directions per sample
+        if directions is None:
+            directions = self.direction_generator.basis(
+                data=data,
+                k=2,
+                targets=targets,
+                destinations=destinations,
+            )
+
+        assert directions.shape[:2] == (len(data), 2)
+
+        return self.sample(
+            data=data,
+            directions=directions,
+        )
+
+    @torch.no_grad()
+    def sample(
+            self,
+            data: torch.Tensor,
+            directions: torch.Tensor,
+    ) -> Dict[str, torch.Tensor]:
+        data = data.detach().to(self.machine)
+        directions = directions.detach().to(self.machine)
+
+        num_data = len(data)
+        size = (num_data, self.grid, self.grid)
+
+        preds = torch.full(size, int(invalid_footprint_val), dtype=torch.int64, device=self.machine)
+        confs = torch.full(size, invalid_footprint_val, dtype=torch.float32, device=self.machine)
+        evaluated = torch.zeros(size, dtype=torch.bool, device=self.machine)
+
+        self.num_evaluations = 0
+
+        # coarsest lattice: evaluated densely
+        step = 2 ** self.refine
+
+        self.evaluate_lattice(
+            data=data,
+            directions=directions,
+            needs=torch.ones_like(evaluated[:, ::step, ::step]),
+            spacing=step,
+            preds=preds,
+            confs=confs,
+            evaluated=evaluated,
+        )
+
+        # adaptive refinement:
+        # only cells whose corners disagree on the predicted class are subdivided,
+        # other new points are filled from (interpolated between) their neighbors
+        while step > 1:
+            half = step // 2
+
+            _preds = preds[:, ::half, ::half]
+            _confs = confs[:, ::half, ::half]
+
+            corners = _preds[:, ::2, ::2]
+            changed = (corners[:, :-1, :-1] != corners[:, 1:, :-1]) | \
+                      (corners[:, :-1, :-1] != corners[:, :-1, 1:]) | \
+                      (corners[:, :-1, :-1] != corners[:, 1:, 1:])
+
+            # points on an edge are needed if any of their (up to 2) cells changed
+            _changed = torch.nn.functional.pad(changed, (1, 1, 1, 1))
+
+            needs = torch.zeros_like(evaluated[:, ::half, ::half])
+            needs[:, 1::2, 1::2] = changed
+            needs[:, 1::2, 0::2] = _changed[:, 1:-1, :-1] | _changed[:, 1:-1, 1:]
+            needs[:, 0::2, 1::2] = _changed[:, :-1, 1:-1] | _changed[:, 1:, 1:-1]
+
+            # fill
+            _preds[:, 1::2, 0::2] = _preds[:, 0:-1:2, 0::2]
+            _preds[:, 0::2, 1::2] = _preds[:, 0::2, 0:-1:2]
+            _preds[:, 1::2, 1::2] = _preds[:, 0:-1:2, 0:-1:2]
+
+            _confs[:, 1::2, 0::2] = (_confs[:, 0:-1:2, 0::2] + _confs[:, 2::2, 0::2]) / 2
+            _confs[:, 0::2, 1::2] = (_confs[:, 0::2, 0:-1:2] + _confs[:, 0::2, 2::2]) / 2
+            _confs[:, 1::2, 1::2] = (_confs[:, 0:-1:2, 0:-1:2] + _confs[:, 2::2, 0:-1:2] +
+                                     _confs[:, 0:-1:2, 2::2] + _confs[:, 2::2, 2::2]) / 4
+
+            # evaluate
+            self.evaluate_lattice(
+                data=data,
+                directions=directions,
+                needs=needs,
+                spacing=half,
+                preds=preds,
+                confs=confs,
+                evaluated=evaluated,
+            )
+
+            step = half
+
+        return {
+            "preds": preds.to("cpu"),
+            "confs": confs.to("cpu"),
+            "evaluated": evaluated.to("cpu"),
+        }
+
+    def coordinates(
+            self,
+            indices: torch.Tensor,
+    ) -> torch.Tensor:
+        # lattice index -> offset along a direction, in [-radius, radius]
+        return (indices / (self.grid - 1) * 2 - 1) * self.radius
+
+    def evaluate_lattice(
+            self,
+            data: torch.Tensor,
+            directions: torch.Tensor,
+            needs: torch.Tensor,
+            spacing: int,
+            preds: torch.Tensor,
+            confs: torch.Tensor,
+            evaluated: torch.Tensor,
+    ) -> None:
+        samples, rows, cols = needs.nonzero().unbind(dim=-1)
+        rows = rows * spacing
+        cols = cols * spacing
+
+        for start in range(0, len(samples), self.batch_size):
+            end = start + self.batch_size
+
+            _preds, _confs = self.evaluate_points(
+                data=data,
+                directions=directions,
+                samples=samples[start:end],
+                rows=rows[start:end],
+                cols=cols[start:end],
+            )
+
+            preds[samples[start:end], rows[start:end], cols[start:end]] = _preds
+            confs[samples[start:end], rows[start:end], cols[start:end]] = _confs
+            evaluated[samples[start:end], rows[start:end], cols[start:end]] = True
+
+    def evaluate_points(
+            self,
+            data: torch.Tensor,
+            directions: torch.Tensor,
+            samples: torch.Tensor,
+            rows: torch.Tensor,
+            cols: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        shape = (-1, *[1] * (data.dim() - 1))
+
+        xs = self.coordinates(rows).to(data.dtype).reshape(shape)
+        ys = self.coordinates(cols).to(data.dtype).reshape(shape)
+
+        points = data[samples] + \
+            xs * directions[samples, 0] + \
+            ys * directions[samples, 1]
+
+        if self.bound:
+            points = points.clamp(0, 1)
+
+        outputs = self.model(points).detach()
+        confs, preds = torch.nn.Softmax(dim=-1)(outputs).max(dim=-1)
+
+        self.num_evaluations += len(points)
+
+        return preds, confs.to(torch.float32)
@@ -0,0 +1,306 @@
+from typing import Dict, Optional, Set, Tuple
+
+import os
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+import tqdm
+import yaml
+
+__all__ = [
+    "TravelStore",
+    "DatasetTraveler",
+]
+
+record_dtype = np.dtype([
+    ("index", "<i8"),
+    ("epsilon", "<f4"),
+])
+
+
+# append-only on-disk store of travel results of one shard
+class TravelStore:
+    def __init__(
+            self,
+            save_dir: str,
+            shard: int = 0,
+    ) -> None:
+        from ..tools.pathtools import mkdir, join_path
+
+        mkdir(save_dir)
+
+        self.save_dir = save_dir
+        self.shard = shard
+        self.records_path = join_path([save_dir, f"shard-{shard}.idx"])
+        self.data_path = join_path([save_dir, f"shard-{shard}.dat"])
+        self.meta_path = join_path([save_dir, "meta.yaml"])
+
+        self.repair()
+
+    def meta(
+            self,
+    ) -> Optional[Dict]:
+        if not os.path.exists(self.meta_path):
+            return None
+
+        with open(self.meta_path, "r") as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
+
+    def sample_nbytes(
+            self,
+    ) -> int:
+        meta = self.meta()
+
+        if meta is None or meta["shape"] is None:
+            return 0
+
+        return int(np.prod(meta["shape"])) * np.dtype(meta["dtype"]).itemsize
+
+    def repair(
+            self,
+    ) -> None:
+        # drop a partially written trailing record (e.g., after a crash)
+        num_records = self.num_records()
+
+        if os.path.exists(self.records_path):
+            os.truncate(self.records_path, num_records * record_dtype.itemsize)
+
+        # data is written before its records, so it may run ahead of them
+        if os.path.exists(self.data_path):
+            os.truncate(self.data_path, num_records * self.sample_nbytes())
+
+    def num_records(
+            self,
+    ) -> int:
+        if not os.path.exists(self.records_path):
+            return 0
+
+        return os.path.getsize(self.records_path) // record_dtype.itemsize
+
+    def finished(
+            self,
+    ) -> Set[int]:
+        return set(self.records()["index"].tolist())
+
+    def records(
+            self,
+    ) -> np.ndarray:
+        if not self.num_records():
+            return np.zeros(shape=(0,), dtype=record_dtype)
+
+        return np.fromfile(
+            self.records_path,
+            dtype=record_dtype,
+            count=self.num_records(),
+        )
+
+    def data(
+            self,
+    ) -> Optional[np.ndarray]:
+        meta = self.meta()
+
+        if meta is None or meta["shape"] is None or not self.num_records():
+            return None
+
+        return np.memmap(
+            self.data_path,
+            dtype=meta["dtype"],
+            mode="r",
+            shape=(self.num_records(), *meta["shape"]),
+        )
+
+    def append(
+            self,
+            indices: torch.Tensor,
+            epsilons: torch.Tensor,
+            data: Optional[torch.Tensor] = None,
+    ) -> None:
+        if data is not None:
+            data = data.detach().to("cpu").contiguous().numpy()
+
+            with open(self.data_path, "ab") as f:
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        records = np.zeros(shape=(len(indices),), dtype=record_dtype)
+        records["index"] = indices.numpy()
+        records["epsilon"] = epsilons.numpy()
+
+        with open(self.records_path, "ab") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def travel_shard(
+        traveler,
+        dataset,
+        save_dir: str,
+        shard: int,
+        num_shards: int,
+        batch_size: int,
+        save_data: bool,
+        verbose: bool,
+) -> None:
+    store = TravelStore(save_dir, shard)
+    finished = store.finished()
+
+    indices = [
+        i for i in range(shard, len(dataset), num_shards)
+        if i not in finished
+    ]
+
+    if not len(indices):
+        return
+
+    dataloader = DataLoader(
+        dataset=Subset(dataset, indices),
+        batch_size=batch_size,
+        shuffle=False,
+    )
+
+    start = 0
+
+    for (data, targets) in tqdm.tqdm(
+            dataloader,
+            desc=f"[{shard + 1}/{num_shards}] Travel",
+            position=shard,
+            disable=not verbose,
+    ):
+        traveled_data, epsilons = traveler(data, targets)
+
+        store.append(
+            indices=torch.tensor(indices[start:start + len(data)], dtype=torch.int64),
+            epsilons=epsilons,
+            data=traveled_data if save_data else None,
+        )
+
+        start += len(data)
+
+
+class DatasetTraveler:
+    def __init__(
+            self,
+            traveler,
+            save_dir: str,
+            batch_size: int = 64,
+            num_shards: int = 1,
+            save_data: bool = False,
+            verbose: bool = False,
+    ) -> None:
+        assert batch_size > 0 and num_shards > 0
+
+        self.traveler = traveler
+        self.save_dir = save_dir
+        self.batch_size = batch_size
+        self.num_shards = num_shards
+        self.save_data = save_data
+        self.verbose = verbose
+
+    def __call__(
+            self,
+            dataset,
+    ) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+        self.write_meta(dataset)
+
+        kwargs = {
+            "traveler": self.traveler,
+            "dataset": dataset,
+            "save_dir": self.save_dir,
+            "num_shards": self.num_shards,
+            "batch_size": self.batch_size,
+            "save_data": self.save_data,
+            "verbose": self.verbose,
+        }
+
+        if self.num_shards == 1:
+            travel_shard(shard=0, **kwargs)
+
+        else:
+            import torch.multiprocessing as mp
+
+            context = mp.get_context("spawn")
+
+            processes = [
+                context.Process(
+                    target=travel_shard,
+                    kwargs=dict(shard=shard, **kwargs),
+                ) for shard in range(self.num_shards)
+            ]
+
+            for process in processes:
+                process.start()
+
+            for process in processes:
+                process.join()
+
+            for shard, process in enumerate(processes):
+                assert process.exitcode == 0, \
+                    f"Travel of shard {shard} failed (exit code {process.exitcode}); " \
+                    f"run again to resume."
+
+        return self.load()
+
+    def write_meta(
+            self,
+            dataset,
+    ) -> None:
+        from ..tools.pathtools import mkdir, join_path
+
+        mkdir(self.save_dir)
+
+        meta_path = join_path([self.save_dir, "meta.yaml"])
+
+        if self.save_data:
+            data, _ = dataset[0]
+            shape = list(data.shape)
+            dtype = str(data.numpy().dtype)
+
+        else:
+            shape = None
+            dtype = None
+
+        meta = {
+            "traveler": getattr(self.traveler, "name", type(self.traveler).__name__),
+            "num_data": len(dataset),
+            "num_shards": self.num_shards,
+            "shape": shape,
+            "dtype": dtype,
+        }
+
+        # resume only with the same configuration
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                _meta = yaml.load(f, Loader=yaml.FullLoader)
+
+            assert _meta == meta, \
+                f"{self.save_dir} holds results of a different travel run:\n" \
+                f"{_meta}"
+
+            return
+
+        with open(meta_path, "w") as f:
+            yaml.dump(meta, f)
+
+    def load(
+            self,
+    ) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+        stores = [TravelStore(self.save_dir, shard) for shard in range(self.num_shards)]
+
+        records = np.concatenate([store.records() for store in stores])
+        order = np.argsort(records["index"], kind="stable")
+
+        indices = torch.from_numpy(records["index"][order])
+        epsilons = torch.from_numpy(records["epsilon"][order])
+
+        if not self.save_data:
+            return indices, epsilons, None
+
+        data = [store.data() for store in stores]
+        data = [d for d in data if d is not None]
+
+        if not len(data):
+            return indices, epsilons, None
+
+        return indices, epsilons, torch.from_numpy(np.concatenate(data)[order])
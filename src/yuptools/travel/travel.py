@@ -1,9 +1,10 @@
-from typing import Tuple, Union
+from typing import List, Optional, Tuple, Union
 
 import torch
 import tqdm
 
 from .config import *
+from .warnings import *
 
 __all__ = [
     "Traveler",
@@ -27,9 +28,16 @@ class Traveler:
             tol: float = 1e-10,
             max_iter: int = 10000,
             turnaround: float = 0.1,
+            search: str = default_search,
+            cache: bool = True,
+            per_sample: bool = False,
     ) -> None:
         from .direction import DirectionGenerator
 
+        # assertions
+        is_valid_travel_search_method(search)
+
+        assert init_eps > 0 or search != "bisection"
         assert stride > 0
         assert 0 < stride_decay < 1
 
@@ -40,6 +48,7 @@ class Traveler:
         self.perp = perp
         self.normalize = normalize
         self.seed = seed
+        self.per_sample = per_sample
         self.direction_generator = DirectionGenerator(
             model=model,
             method=method,
@@ -47,33 +56,33 @@ class Traveler:
             normalize=normalize,
             seed=seed,
             use_cuda=use_cuda,
+            per_sample=per_sample,
         )
 
         # travel hyperparameters
         self.bound = bound
+        self.search = search
+
+        # per-sample memo of predictions of the last two evaluations (on the device)
+        self.cache = cache
+        self.memo: List[torch.Tensor] = []
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         self.hyperparameters = {
             "init_eps": init_eps,
             "stride": stride,
             "stride_decay": stride_decay,
         }
-        self.epsilon = init_eps
-        self.stride = stride
         self.stride_decay = stride_decay
         self.tol = tol
         self.max_iter = max_iter
         self.turnaround = turnaround
 
-        self.correct = None
-        self._correct = None
-        self.flag = False
-
         self.use_cuda = use_cuda
         self.machine = "cuda" if use_cuda else "cpu"
         self.verbose = verbose
 
-        self.num_data = 0
-
         Traveler.__name__ = \
             f"{self.method}_travel(" \
             f"perp={self.perp}, " \
@@ -82,125 +91,330 @@ class Traveler:
             f"seed={self.seed}" \
             f")"
 
+        # per instance (Traveler.__name__ follows the latest instance),
+        # with every parameter that changes the results
+        self.name = \
+            f"{self.method}_travel(" \
+            f"perp={self.perp}, " \
+            f"normalize={self.normalize}, " \
+            f"bound={self.bound}, " \
+            f"seed={self.seed}, " \
+            f"init_eps={init_eps}, " \
+            f"stride={stride}, " \
+            f"stride_decay={stride_decay}, " \
+            f"tol={tol}, " \
+            f"max_iter={max_iter}, " \
+            f"turnaround={turnaround}, " \
+            f"search={search}, " \
+            f"per_sample={per_sample}" \
+            f")"
+
     def __call__(
             self,
             data: torch.Tensor,
             targets: torch.Tensor,
     ) -> Tuple[torch.Tensor, torch.Tensor]:
-        self.num_data = len(data)
-
         directions = self.direction_generator(data, targets)
 
-        traveled_data = torch.zeros_like(data)
-        epsilons = torch.zeros(size=(self.num_data,))
+        return self.travel(
+            data=data,
+            targets=targets,
+            directions=directions,
+        )
 
-        for i in range(self.num_data):
-            traveled_data[i], epsilons[i] = self.travel(
-                data=data[i],
-                target=targets[i],
-                direction=directions[i],
-                i=i,
-            )
+    def update(
+            self,
+            epsilons: torch.Tensor,
+            strides: torch.Tensor,
+            crossed: torch.Tensor,
+            iteration: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        # crossed the decision boundary: decrease epsilon & stride
+        # still inside the decision region: increase epsilon
+        epsilons = torch.where(crossed, epsilons - strides, epsilons + strides)
+        strides = torch.where(crossed, strides * self.stride_decay, strides)
+
+        # epsilon must be over 0
+        epsilons = epsilons.clamp(min=0)
 
-            self.reset()
+        # divergence test:
+        # if data still remains inside its decision region (no change in stride)
+        # after {turnaround * 100}% of max_iter,
+        # end travel.
+        if iteration > self.max_iter * self.turnaround:
+            diverged = strides == self.hyperparameters["stride"]
+        else:
+            diverged = torch.zeros_like(crossed)
 
-        return traveled_data, epsilons
+        return epsilons, strides, diverged
 
-    def reset(
+    def predict(
             self,
-    ) -> None:
-        self.epsilon = self.hyperparameters["init_eps"]
-        self.stride = self.hyperparameters["stride"]
-        self.stride_decay = self.hyperparameters["stride_decay"]
+            data: torch.Tensor,
+    ) -> torch.Tensor:
+        outputs = self.model(data.detach().to(self.machine)).detach()
 
-        self.correct = None
-        self._correct = None
-        self.flag = False
+        # argmax of logits == argmax of softmax
+        return torch.argmax(outputs, dim=-1)
 
-    def update(
+    def is_correct(
             self,
-            iteration: int,
-    ) -> None:
-        # crossed the decision boundary
-        if self.correct != self._correct:
-            self.flag = True
+            data: torch.Tensor,
+            targets: torch.Tensor,
+    ) -> torch.Tensor:
+        preds = self.predict(data)
 
-            # decrease epsilon & stride
-            self.epsilon = self.epsilon - self.stride
-            self.stride = self.stride * self.stride_decay
+        return torch.eq(preds, targets.to(preds.device))
 
-        # still inside the decision region
-        else:
-            self.flag = False
+    def is_correct_at(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            directions: torch.Tensor,
+            epsilons: torch.Tensor,
+            indices: torch.Tensor,
+            revisits: Optional[torch.Tensor] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        _data = self.move(data[indices], directions[indices], epsilons)
+        _targets = targets[indices]
 
-            # increase epsilon
-            self.epsilon = self.epsilon + self.stride
+        if not self.cache:
+            return _data, self.is_correct(_data, _targets)
 
-        # epsilon must be over 0
-        if self.epsilon < 0:
-            self.epsilon = 0
+        # memo[0]: predictions two evaluations ago, memo[1]: predictions of the last evaluation
+        preds = self.memo[0][indices]
 
-        # divergence test:
-        # if data still remains inside its decision region (no change in stride)
-        # after {turnaround * 100}% of max_iter,
-        # end travel.
-        if iteration > self.max_iter * self.turnaround \
-                and self.stride == self.hyperparameters["stride"]:
-            self.flag = "break"
+        if revisits is None:
+            revisits = torch.zeros_like(_targets, dtype=torch.bool)
 
-    def is_correct(
+        # revisited epsilons reuse the prediction made two evaluations ago
+        if not revisits.all():
+            preds[~revisits] = self.predict(_data[~revisits])
+
+        self.memo[0][indices] = self.memo[1][indices]
+        self.memo[1][indices] = preds
+
+        self.cache_hits += revisits.sum()
+        self.cache_misses += (~revisits).sum()
+
+        return _data, torch.eq(preds, _targets)
+
+    def move(
             self,
             data: torch.Tensor,
-            target: torch.Tensor,
-    ) -> bool:
-        output = self.model(data.detach().to(self.machine)).detach().to("cpu")
+            directions: torch.Tensor,
+            epsilons: torch.Tensor,
+    ) -> torch.Tensor:
+        epsilons = epsilons.to(data.dtype).reshape(-1, *[1] * (data.dim() - 1))
+
+        _data = data + (directions * epsilons)
 
-        conf = torch.nn.Softmax(dim=-1)(output)
-        pred = torch.argmax(conf, dim=-1)
+        if self.bound:
+            _data = _data.clamp(0, 1)
 
-        return bool(torch.eq(pred, target))
+        return _data
 
+    @torch.no_grad()
     def travel(
             self,
             data: torch.Tensor,
-            target: torch.Tensor,
-            direction: torch.Tensor,
-            i: int,
-    ) -> Tuple[torch.Tensor, float]:
-        data = data.unsqueeze(dim=0)
+            targets: torch.Tensor,
+            directions: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        data = data.detach().to(self.machine)
+        targets = targets.detach().to(self.machine)
+        directions = directions.detach().to(self.machine)
+
+        traveled_data = data.clone()
+        results = torch.zeros(
+            size=(len(data),),
+            dtype=torch.float64,
+            device=self.machine,
+        )
+
+        preds = self.predict(data)
+        correct = torch.eq(preds, targets)
+
+        self.memo = [preds.clone(), preds.clone()]
+        self.cache_hits = torch.zeros(size=(), dtype=torch.int64, device=self.machine)
+        self.cache_misses = torch.zeros(size=(), dtype=torch.int64, device=self.machine)
+
+        results[~correct] = eps_for_incorrect
+
+        if self.search == "stride":
+            search = self.stride_search
+
+        elif self.search == "bisection":
+            search = self.bisection_search
+
+        else:
+            raise
+
+        search(
+            data=data,
+            targets=targets,
+            directions=directions,
+            active=correct,
+            traveled_data=traveled_data,
+            results=results,
+        )
 
-        self.correct = self.is_correct(data, target)
+        self.memo = []
+        self.cache_hits = int(self.cache_hits)
+        self.cache_misses = int(self.cache_misses)
 
-        if not self.correct:
-            return data, eps_for_incorrect
+        return traveled_data.to("cpu"), results.to(torch.float32).to("cpu")
 
-        _data = data
+    def stride_search(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            directions: torch.Tensor,
+            active: torch.Tensor,
+            traveled_data: torch.Tensor,
+            results: torch.Tensor,
+    ) -> None:
+        # per-sample travel states (float64 to match python float precision)
+        epsilons = torch.full_like(results, float(self.hyperparameters["init_eps"]))
+        strides = torch.full_like(results, float(self.hyperparameters["stride"]))
+
+        correct = active.clone()
+
+        # an epsilon is revisited right after stepping forward (not crossed) and then back (crossed):
+        # eps -> eps + stride -> eps + stride - stride; no revisit before the first two evaluations
+        crossed = torch.ones_like(active)
+        revisits = torch.zeros_like(active)
 
         for iteration in tqdm.trange(
                 self.max_iter,
-                desc=f"[{i + 1}/{self.num_data}] {Traveler.__name__}",
+                desc=f"{Traveler.__name__}",
                 disable=not self.verbose,
         ):
-            self._correct = self.correct
+            indices = active.nonzero().squeeze(dim=-1)
 
-            _data = data + (direction * self.epsilon)
+            if not len(indices):
+                break
 
-            if self.bound:
-                _data = _data.clamp(0, 1)
+            _correct = correct[indices]
 
-            self.correct = self.is_correct(_data, target)
+            _data, correct[indices] = self.is_correct_at(
+                data=data,
+                targets=targets,
+                directions=directions,
+                epsilons=epsilons[indices],
+                indices=indices,
+                revisits=revisits[indices],
+            )
+            traveled_data[indices] = _data
 
-            # print(f"[eps: {self.epsilon}, stride: {self.stride}] {self._correct} -> {self.correct}")
+            _crossed = correct[indices] != _correct
+
+            _epsilons, _strides, diverged = self.update(
+                epsilons=epsilons[indices],
+                strides=strides[indices],
+                crossed=_crossed,
+                iteration=iteration,
+            )
+            epsilons[indices] = _epsilons
+            strides[indices] = _strides
 
-            self.update(iteration)
+            revisits[indices] = _crossed & ~crossed[indices]
+            crossed[indices] = _crossed
 
             # diverged
-            if self.flag == "break":
-                return data, eps_for_divergence
+            diverged_indices = indices[diverged]
+            traveled_data[diverged_indices] = data[diverged_indices]
+            results[diverged_indices] = eps_for_divergence
 
             # converged: just crossed the decision boundary
-            if self.stride < self.tol and not self.correct:
-                return _data, self.epsilon
+            converged = ~diverged & (_strides < self.tol) & ~correct[indices]
+            converged_indices = indices[converged]
+            results[converged_indices] = _epsilons[converged]
+
+            active[diverged_indices] = False
+            active[converged_indices] = False
+
+        # not fully converged
+        results[active] = -epsilons[active]
+
+    def bisection_search(
+            self,
+            data: torch.Tensor,
+            targets: torch.Tensor,
+            directions: torch.Tensor,
+            active: torch.Tensor,
+            traveled_data: torch.Tensor,
+            results: torch.Tensor,
+    ) -> None:
+        # the farthest epsilon the stride search reaches before its divergence test
+        max_eps = self.hyperparameters["init_eps"] + \
+            self.hyperparameters["stride"] * self.max_iter * self.turnaround
+
+        # boundary is bracketed by [lower, upper]:
+        # correct at lower, incorrect at upper (once found)
+        lowers = torch.zeros_like(results)
+        uppers = torch.full_like(results, float(self.hyperparameters["init_eps"]))
+        bracketing = active.clone()
+        epsilons = uppers.clone()
+
+        for _ in tqdm.trange(
+                self.max_iter,
+                desc=f"{Traveler.__name__}",
+                disable=not self.verbose,
+        ):
+            indices = active.nonzero().squeeze(dim=-1)
+
+            if not len(indices):
+                break
+
+            _bracketing = bracketing[indices]
+            _lowers = lowers[indices]
+            _uppers = uppers[indices]
+
+            # exponential bracketing, then bisection
+            _epsilons = torch.where(_bracketing, _uppers, (_lowers + _uppers) / 2)
+            epsilons[indices] = _epsilons
+
+            _data, correct = self.is_correct_at(
+                data=data,
+                targets=targets,
+                directions=directions,
+                epsilons=_epsilons,
+                indices=indices,
+            )
+            traveled_data[indices] = _data
+
+            # still inside the decision region
+            _lowers = torch.where(correct, _epsilons, _lowers)
+            _uppers = torch.where(
+                correct,
+                torch.where(_bracketing, (_epsilons * 2).clamp(max=max_eps), _uppers),
+                _epsilons,
+            )
+            _bracketing = _bracketing & correct
+
+            lowers[indices] = _lowers
+            uppers[indices] = _uppers
+            bracketing[indices] = _bracketing
+
+            # diverged
+            diverged = _bracketing & (_epsilons >= max_eps)
+            diverged_indices = indices[diverged]
+            traveled_data[diverged_indices] = data[diverged_indices]
+            results[diverged_indices] = eps_for_divergence
+
+            # converged: boundary bracketed within tol
+            converged = ~_bracketing & (_uppers - _lowers < self.tol)
+            converged_indices = indices[converged]
+            traveled_data[converged_indices] = self.move(
+                data[converged_indices],
+                directions[converged_indices],
+                _uppers[converged],
+            )
+            results[converged_indices] = _uppers[converged]
+
+            active[diverged_indices] = False
+            active[converged_indices] = False
 
         # not fully converged
-        return _data, -self.epsilon
+        results[active] = -epsilons[active]
@@ -1,6 +1,8 @@
 __all__ = [
     "is_valid_direction_method",
     "is_valid_direction_normalize_method",
+    "is_valid_travel_search_method",
+    "is_valid_footprint_output",
 ]
 
 
@@ -22,3 +24,23 @@ def is_valid_direction_normalize_method(
     assert method in direction_normalize_methods, \
         f"Unsupported method {method}.\n" \
         f"Supported methods: {direction_normalize_methods}"
+
+
+def is_valid_travel_search_method(
+        method: str,
+) -> None:
+    from .config import travel_search_methods
+
+    assert method in travel_search_methods, \
+        f"Unsupported method {method}.\n" \
+        f"Supported methods: {travel_search_methods}"
+
+
+def is_valid_footprint_output(
+        output: str,
+) -> None:
+    from .config import footprint_outputs
+
+    assert output in footprint_outputs, \
+        f"Unsupported output {output}.\n" \
+        f"Supported outputs: {footprint_outputs}"